@@ -1,6 +1,7 @@
 import ast
 import math
 import os
+import pickle
 import sys
 import time
 from collections import defaultdict
@@ -9,7 +10,10 @@ from typing import Dict, List
 
 from tqdm import tqdm
 
+from ers.benchmark.util.index_util import load_index, save_index
+from ers.benchmark.util.memory_util import deep_sizeof, serialized_size, traced_peak
 from ers.benchmark.util.query_generator import generate_bucket_query_2d, generate_bucket_query_3d
+from ers.benchmark.util.stats_util import PERCENTILES, percentiles, histogram, throughput
 from ers.benchmark.util.xlsx_util import XLSXUtil
 from ers.schemes.common.emm import EMMEngine
 from ers.schemes.dependent.quad_src_data_dependent import QuadSRCDataDependent
@@ -19,9 +23,19 @@ from ers.schemes.hilbert.tdag_src_hilbert import TdagSRCHilbert
 from ers.schemes.quad_src import QuadSRC
 from ers.schemes.tdag_src import TdagSRC
 from ers.structures.hyperrange import HyperRange
+from ers.util.hyperrange.divider import HyperRangeDivider
+from ers.util.profiling.build_profiler import PHASES, COUNTS
+from ers.util.storage.storage import EncryptedIndexStorage
 
 BUCK_SIZE = 10
 
+# Engine arguments that only affect how a built index is used, so a reused index takes those of the current run.
+RUNTIME_ENGINE_KWARGS = ("build_workers", "resolve_workers")
+
+# The built scheme, its key, the dataset and the trapdoor arguments, set once per query worker by
+# `init_query_worker` so that the tasks only carry their query.
+query_context = {}
+
 
 def compute_precision(scheme):
     return isinstance(scheme, (QuadSRC, QuadSRCHilbert, TdagSRC, TdagSRCHilbert, QuadSRCDataDependent, QuadSRCHilbertDataDependent))
@@ -65,9 +79,21 @@ def generate_query_bucks(
     return dict(ten_bucks)
 
 
-def run_query(target_bucket, query, scheme, key, dataset):
+def compute_tree_size(scheme):
+    # The dividers are excluded, as the data-dependent ones reference the plaintext multi-map.
+    trees = [getattr(scheme, attribute) for attribute in ("tree", "tree_product", "tdag") if hasattr(scheme, attribute)]
+    return sum(deep_sizeof(tree, exclude=(HyperRangeDivider,)) for tree in trees)
+
+
+def compute_client_size(scheme):
+    # Everything the client keeps besides the encrypted index and the engine: trees, Hilbert curve and parameters.
+    return deep_sizeof(scheme, exclude=(HyperRangeDivider, EncryptedIndexStorage, EMMEngine))
+
+
+def run_query(target_bucket, query, scheme, key, dataset, trapdoor_kwargs):
+    started_at = time.time()
     t0 = time.perf_counter()
-    trapdoors = scheme.trapdoor(key, query)
+    trapdoors = scheme.trapdoor(key, query, **trapdoor_kwargs)
     t1 = time.perf_counter()
 
     trapdoor_time = t1 - t0
@@ -91,6 +117,7 @@ def run_query(target_bucket, query, scheme, key, dataset):
     t1 = time.perf_counter()
 
     resolve_time = t1 - t0
+    finished_at = time.time()
 
     if compute_precision(scheme):
         true_positives = set().union(*(
@@ -106,6 +133,12 @@ def run_query(target_bucket, query, scheme, key, dataset):
     else:
         precision = -1
 
+    if "max_segments" in trapdoor_kwargs:
+        cover = scheme.hc.brc_with_merging(query, trapdoor_kwargs.get("merging_tolerance", 0), trapdoor_kwargs["max_segments"])
+        false_positive_volume = scheme.hc.false_positive_volume(query, cover)
+    else:
+        false_positive_volume = 0
+
     return {
         "target_bucket": target_bucket,
         "trapdoor_time": trapdoor_time,
@@ -114,34 +147,103 @@ def run_query(target_bucket, query, scheme, key, dataset):
         "search_time": search_time,
         "search_count": search_count,
         "resolve_time": resolve_time,
-        "precision": precision
+        "precision": precision,
+        "false_positive_volume": false_positive_volume,
+        "query_time": trapdoor_time + search_time + resolve_time,
+        "started_at": started_at,
+        "finished_at": finished_at
     }
 
 
+def init_query_worker(context: bytes):
+    """
+    Initializes a query worker with the pickled arguments of `run_query` shared by every query,
+    unpickled once per worker instead of once per query.
+    """
+    query_context.update(pickle.loads(context))
+
+
 def run_query_with_params(args):
-    return run_query(*args)
+    target_bucket, query = args
+    return run_query(target_bucket, query, **query_context)
+
+
+def run_closed_loop(tasks, context, clients):
+    """
+    Runs the queries with a fixed number of concurrent clients, each issuing its next query as soon as
+    the previous one is answered.
+
+    :return: The sustained number of queries per second.
+    """
+    with ProcessPoolExecutor(max_workers=clients, initializer=init_query_worker, initargs=(pickle.dumps(context),)) as executor:
+        results = list(tqdm(executor.map(run_query_with_params, tasks), total=len(tasks), desc=f"Running queries with {clients} clients"))
+
+    return throughput([r["started_at"] for r in results], [r["finished_at"] for r in results])
 
 
-def run_benchmark(report_name, scheme_constructor, dimensions, dataset, queries_count, domain_size):
+def run_benchmark(report_name, scheme_constructor, dimensions, dataset, queries_count, domain_size, engine_kwargs=None, trapdoor_kwargs=None,
+                  query_workers=None, index_artifact=None, index_options=None, concurrency=(), trace_memory=False):
     xlsx_util = XLSXUtil(report_name)
 
     #############################################################################
     ### Building index
     #############################################################################
-    print("Building index...")
-    scheme = scheme_constructor(EMMEngine(dimensions * [domain_size], dimensions))
-    key = scheme.setup(16)
+    loaded = None
+    if index_artifact:
+        t0 = time.perf_counter()
+        loaded = load_index(index_artifact, index_options)
+        t1 = time.perf_counter()
 
-    t0 = time.perf_counter()
-    scheme.build_index(key, dataset)
-    t1 = time.perf_counter()
+    if loaded is not None:
+        print(f"Reusing index {index_artifact}...")
+        scheme, key, index_build_time = loaded
+
+        for name in RUNTIME_ENGINE_KWARGS:
+            if name in (engine_kwargs or {}):
+                setattr(scheme.emm_engine, name, engine_kwargs[name])
+
+        xlsx_util.write_to_page("index_load_time", [t1 - t0])
+    else:
+        print("Building index...")
+        scheme = scheme_constructor(EMMEngine(dimensions * [domain_size], dimensions, **(engine_kwargs or {})))
+        key = scheme.setup(16)
+
+        t0 = time.perf_counter()
+        if trace_memory:
+            _, build_peak_memory = traced_peak(scheme.build_index, key, dataset)
+        else:
+            scheme.build_index(key, dataset)
+        t1 = time.perf_counter()
+
+        index_build_time = t1 - t0
+        if trace_memory:
+            xlsx_util.write_to_page("build_peak_memory", [build_peak_memory])
+        if index_artifact:
+            save_index(index_artifact, scheme, key, index_build_time, index_options)
 
-    index_build_time = t1 - t0
     xlsx_util.write_to_page("index_time", [index_build_time])
 
+    profiler = scheme.emm_engine.profiler
+    for phase in PHASES:
+        if phase in profiler.times:
+            xlsx_util.write_to_page(f"build_{phase}_time", [profiler.times[phase]])
+    for name in COUNTS:
+        if name in profiler.counts:
+            xlsx_util.write_to_page(f"build_{name}_count", [profiler.counts[name]])
+
+    build_stats = scheme.emm_engine.build_stats
+    xlsx_util.write_to_page("index_labels_per_second", [build_stats["labels_per_second"]])
+    xlsx_util.write_to_page("index_values_per_second", [build_stats["values_per_second"]])
+
     encrypted_database_size = sum(sys.getsizeof(k) + sys.getsizeof(v) for k, v in scheme.encrypted_db.items())
     xlsx_util.write_to_page("index_size", [encrypted_database_size])
 
+    xlsx_util.write_to_page("index_disk_size", [serialized_size(scheme.encrypted_db)])
+    xlsx_util.write_to_page("index_memory_size", [deep_sizeof(scheme.encrypted_db)])
+    xlsx_util.write_to_page("client_memory_size", [compute_client_size(scheme)])
+
+    xlsx_util.write_to_page("tree_size", [compute_tree_size(scheme)])
+
     #############################################################################
     ### Running Queries
     #############################################################################
@@ -162,30 +264,45 @@ def run_benchmark(report_name, scheme_constructor, dimensions, dataset, queries_
 
     precision_map = defaultdict(list)
 
+    false_positive_volume_map = defaultdict(list)
+
+    query_time_map = defaultdict(list)
+
     ### Queries
     ten_bucks = generate_query_bucks(queries_count, dimensions, domain_size)
 
-    with ProcessPoolExecutor() as executor:
-        tasks = []
-        for target_bucket in range(0, 99, BUCK_SIZE):
-            for q in ten_bucks[target_bucket]:
-                tasks.append((target_bucket, q, scheme, key, dataset))
+    tasks = []
+    for target_bucket in range(0, 99, BUCK_SIZE):
+        for q in ten_bucks[target_bucket]:
+            tasks.append((target_bucket, q))
+
+    context = {"scheme": scheme, "key": key, "dataset": dataset, "trapdoor_kwargs": trapdoor_kwargs or {}}
+    if query_workers == 1:
+        # A single process runs the queries one after the other, so that their latencies do not interfere.
+        query_context.update(context)
+        results = [run_query_with_params(task) for task in tqdm(tasks, desc="Running queries")]
+        query_context.clear()
+    else:
+        with ProcessPoolExecutor(max_workers=query_workers, initializer=init_query_worker, initargs=(pickle.dumps(context),)) as executor:
+            results = list(tqdm(executor.map(run_query_with_params, tasks), total=len(tasks), desc="Running queries"))
+
+    for result in results:
+        tb = result["target_bucket"]
 
-        results = list(tqdm(executor.map(run_query_with_params, tasks), total=len(tasks), desc="Running queries"))
+        trapdoor_time_map[tb].append(result["trapdoor_time"])
+        trapdoor_size_map[tb].append(result["trapdoor_size"])
+        trapdoor_count_map[tb].append(result["trapdoor_count"])
 
-        for result in results:
-            tb = result["target_bucket"]
+        search_time_map[tb].append(result["search_time"])
+        search_count_map[tb].append(result["search_count"])
 
-            trapdoor_time_map[tb].append(result["trapdoor_time"])
-            trapdoor_size_map[tb].append(result["trapdoor_size"])
-            trapdoor_count_map[tb].append(result["trapdoor_count"])
+        resolve_time_map[tb].append(result["resolve_time"])
 
-            search_time_map[tb].append(result["search_time"])
-            search_count_map[tb].append(result["search_count"])
+        precision_map[tb].append(result["precision"])
 
-            resolve_time_map[tb].append(result["resolve_time"])
+        false_positive_volume_map[tb].append(result["false_positive_volume"])
 
-            precision_map[tb].append(result["precision"])
+        query_time_map[tb].append(result["query_time"])
 
     for bucket, trapdoor_times in trapdoor_time_map.items():
         xlsx_util.write_to_page("trapdoor_time", [bucket, (sum(trapdoor_times) / len(trapdoor_times))])
@@ -211,4 +328,27 @@ def run_benchmark(report_name, scheme_constructor, dimensions, dataset, queries_
         else:
             xlsx_util.write_to_page("precision", [bucket, (sum(precisions) / len(precisions))])
 
+    if "max_segments" in (trapdoor_kwargs or {}):
+        for bucket, volumes in false_positive_volume_map.items():
+            xlsx_util.write_to_page("false_positive_volume", [bucket, math.floor(sum(volumes) / len(volumes))])
+
+    ### Latency distributions
+    xlsx_util.write_rows("query_samples", [
+        [r["target_bucket"], r["trapdoor_time"], r["search_time"], r["resolve_time"], r["query_time"]] for r in results
+    ])
+
+    for metric, time_map in (("trapdoor_time", trapdoor_time_map), ("search_time", search_time_map),
+                             ("resolve_time", resolve_time_map), ("query_time", query_time_map)):
+        for bucket, times in time_map.items():
+            for (suffix, _), value in zip(PERCENTILES, percentiles(times)):
+                xlsx_util.write_to_page(f"{metric}_{suffix}", [bucket, value])
+
+    xlsx_util.write_rows("query_time_histogram", [list(b) for b in histogram([r["query_time"] for r in results])])
+
+    ### Throughput
+    xlsx_util.write_to_page("throughput", [throughput([r["started_at"] for r in results], [r["finished_at"] for r in results])])
+
+    for clients in concurrency:
+        xlsx_util.write_to_page("closed_loop_throughput", [clients, run_closed_loop(tasks, context, clients)])
+
     xlsx_util.close()
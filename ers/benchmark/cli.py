@@ -1,9 +1,13 @@
 import argparse
+import os
 from argparse import Namespace
 from datetime import datetime
+from functools import partial
 
 from ers.benchmark.benchmark import run_benchmark
 from ers.benchmark.util.dataset_generator import generate_cali, generate_spitz, generate_gowalla, generate_dense_database_2d, generate_nh_64, generate_random_database_2d, generate_dense_database_3d
+from ers.benchmark.util.index_util import dataset_fingerprint
+from ers.schemes.common.emm_engine import LABEL_VERSION_LEGACY, LABEL_VERSION_COUNTER
 from ers.schemes.dependent.quad_brc_data_dependent import QuadBRCDataDependent
 from ers.schemes.dependent.quad_src_data_dependent import QuadSRCDataDependent
 from ers.schemes.dependent.range_brc_data_dependent import RangeBRCDataDependent
@@ -20,7 +24,15 @@ from ers.schemes.quad_brc import QuadBRC
 from ers.schemes.quad_src import QuadSRC
 from ers.schemes.range_brc import RangeBRC
 from ers.schemes.tdag_src import TdagSRC
+from ers.structures.array_hyperrange_tree import ArrayHyperRangeTree
+from ers.structures.hyperrange import LABEL_ENCODINGS
+from ers.structures.hyperrange_tree import HyperRangeTree
+from ers.structures.lazy_hyperrange_tree import LazyHyperRangeTree
 from ers.structures.point import Point
+from ers.util.crypto.cipher_suite import CIPHER_SUITES
+from ers.util.storage.dict_storage import DictStorage
+from ers.util.storage.mmap_storage import MmapStorage
+from ers.util.storage.sqlite_storage import SQLiteStorage
 
 #############################################################################
 ### SCHEME DICTS
@@ -45,6 +57,29 @@ schemes = {
     "quad_src_hilbert_data_dependent": QuadSRCHilbertDataDependent,
 }
 
+# The Hilbert schemes whose trapdoors cover the query with several Hilbert segments.
+segment_schemes = {
+    "linear_hilbert",
+    "range_brc_hilbert",
+    "quad_brc_hilbert",
+    "range_brc_hilbert_data_dependent",
+    "quad_brc_hilbert_data_dependent",
+}
+
+# The representations of the trees materialized by the data-dependent schemes.
+trees = {
+    "object": HyperRangeTree,
+    "array": ArrayHyperRangeTree,
+}
+
+# The schemes whose uniform or mid-overlap trees can be implicit (LazyHyperRangeTree) instead of materialized.
+lazy_tree_schemes = {
+    "tdag_src",
+    "tdag_src_hilbert",
+    "quad_brc_hilbert",
+    "quad_src_hilbert",
+}
+
 #############################################################################
 ### DATASETS DICTS
 #############################################################################
@@ -79,6 +114,23 @@ def get_dataset(dataset_name: str, domain_size: int, records_limit: int):
 
     return d, dim
 
+#############################################################################
+### STORAGES
+#############################################################################
+
+def get_storage(storage_name: str, index_path: str):
+    match storage_name:
+        case "dict":
+            return DictStorage
+        case "mmap":
+            os.makedirs(os.path.dirname(index_path), exist_ok=True)
+            return partial(MmapStorage, f"{index_path}.mmap")
+        case "sqlite":
+            os.makedirs(os.path.dirname(index_path), exist_ok=True)
+            return partial(SQLiteStorage, f"{index_path}.sqlite")
+        case _:
+            raise ValueError(f"Unknown storage: {storage_name}. Should be: dict, mmap, sqlite.")
+
 #############################################################################
 ### PARSER
 #############################################################################
@@ -115,6 +167,93 @@ def parse_args() -> Namespace:
         type=int,
         help="Mandatory queries count argument"
     )
+    parser.add_argument(
+        "--build-workers",
+        default=1,
+        type=int,
+        help="Number of processes used to encrypt the index"
+    )
+    parser.add_argument(
+        "--query-workers",
+        default=0,
+        type=int,
+        help="Number of processes running the queries (0 uses every CPU, 1 runs them in this process)"
+    )
+    parser.add_argument(
+        "--concurrency",
+        default=[],
+        type=int,
+        nargs="*",
+        help="Numbers of concurrent clients for which the sustained throughput of the queries is measured in a closed loop"
+    )
+    parser.add_argument(
+        "--label-version",
+        default=LABEL_VERSION_COUNTER,
+        type=int,
+        choices=[LABEL_VERSION_LEGACY, LABEL_VERSION_COUNTER],
+        help="Derivation of the encrypted entry labels: 0 (legacy, zero-filled counter) or 1 (fixed-width counter)"
+    )
+    parser.add_argument(
+        "--storage",
+        default="dict",
+        type=str,
+        choices=["dict", "mmap", "sqlite"],
+        help="Storage of the encrypted index: in memory (dict) or in a file under ./indexes (mmap, sqlite)"
+    )
+    parser.add_argument(
+        "--block-size",
+        default=0,
+        type=int,
+        help="Number of ciphertexts packed per index entry (0 stores one ciphertext per entry)"
+    )
+    parser.add_argument(
+        "--resolve-workers",
+        default=1,
+        type=int,
+        help="Number of threads used to decrypt search results"
+    )
+    parser.add_argument(
+        "--cipher-suite",
+        default="aes-cbc",
+        type=str,
+        choices=list(CIPHER_SUITES.keys()),
+        help="Encryption of the index values: aes-cbc (padded, 16-byte IV) or aes-ctr (unpadded, 12-byte nonce)"
+    )
+    parser.add_argument(
+        "--label-encoding",
+        default="json",
+        type=str,
+        choices=list(LABEL_ENCODINGS),
+        help="Serialization of the range labels: json (legacy) or binary (fixed-width little-endian coordinates)"
+    )
+    parser.add_argument(
+        "--tree",
+        default="object",
+        type=str,
+        choices=list(trees.keys()),
+        help="Representation of the trees materialized by the data-dependent schemes: one object per node or flat arrays"
+    )
+    parser.add_argument(
+        "--lazy-tree",
+        action="store_true",
+        help="Compute the nodes of the trees of the uniform and mid-overlap schemes on demand instead of materializing them, for domains too large to fit in memory"
+    )
+    parser.add_argument(
+        "--max-segments",
+        default=0,
+        type=int,
+        help="Maximum number of Hilbert segments covering a query, merging the smallest gaps (0 does not merge)"
+    )
+    parser.add_argument(
+        "--trace-memory",
+        action="store_true",
+        help="Trace the memory allocations while building the index and report their peak (slows the build down)"
+    )
+    parser.add_argument(
+        "--reuse-index",
+        action="store_true",
+        help="Save the built index under ./indexes and reuse it in later runs with the same scheme, dataset, domain size, records limit and build options"
+    )
 
     return parser.parse_args()
 
@@ -122,7 +261,23 @@ def parse_args() -> Namespace:
 if __name__ == "__main__":
     args = parse_args()
 
+    if args.query_workers < 0:
+        raise ValueError("The number of query workers cannot be negative.")
+    if any(clients < 1 for clients in args.concurrency):
+        raise ValueError("The number of concurrent clients must be positive.")
+    if args.max_segments < 0:
+        raise ValueError("The maximum number of segments cannot be negative.")
+    if args.max_segments and args.scheme not in segment_schemes:
+        raise ValueError(f"--max-segments is only supported by: {', '.join(sorted(segment_schemes))}.")
+
+    if args.lazy_tree and args.scheme not in lazy_tree_schemes:
+        raise ValueError(f"--lazy-tree is only supported by: {', '.join(sorted(lazy_tree_schemes))}.")
+
     scheme = schemes[args.scheme]
+    if args.scheme.endswith("data_dependent"):
+        scheme = partial(scheme, tree_class=trees[args.tree])
+    elif args.lazy_tree:
+        scheme = partial(scheme, tree_class=LazyHyperRangeTree)
 
     dataset, dimensions = get_dataset(args.dataset, args.domain_size, args.records_limit)
 
@@ -133,8 +288,48 @@ if __name__ == "__main__":
           f"*     > Dataset domain_size: {args.domain_size}\n"
           f"*     > Records limit: {args.records_limit}\n"
           f"*     > Queries count: {args.queries_count}\n"
+          f"*     > Build workers: {args.build_workers}\n"
+          f"*     > Query workers: {args.query_workers}\n"
+          f"*     > Concurrency: {args.concurrency}\n"
+          f"*     > Label version: {args.label_version}\n"
+          f"*     > Storage: {args.storage}\n"
+          f"*     > Block size: {args.block_size}\n"
+          f"*     > Resolve workers: {args.resolve_workers}\n"
+          f"*     > Cipher suite: {args.cipher_suite}\n"
+          f"*     > Label encoding: {args.label_encoding}\n"
+          f"*     > Tree: {args.tree}\n"
+          f"*     > Lazy tree: {args.lazy_tree}\n"
+          f"*     > Max segments: {args.max_segments}\n"
+          f"*     > Trace memory: {args.trace_memory}\n"
+          f"*     > Reuse index: {args.reuse_index}\n"
           f"************************************************************\n")
 
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
     report_name = f"./benchmarks/{args.scheme}_{args.dataset}_{dimensions}_{args.domain_size}_{args.records_limit}_{args.queries_count}_{timestamp}.xlsx"
-    run_benchmark(report_name, scheme, dimensions, dataset, args.queries_count, args.domain_size)
+    index_path = f"./indexes/{args.scheme}_{args.dataset}_{dimensions}_{args.domain_size}_{args.records_limit}"
+    # A saved index keeps its file next to the artifact, so that runs which do not reuse it cannot overwrite it.
+    index_artifact = f"{index_path}.index" if args.reuse_index else None
+    engine_kwargs = {
+        "build_workers": args.build_workers,
+        "label_version": args.label_version,
+        "storage": get_storage(args.storage, index_artifact or index_path),
+        "block_size": args.block_size,
+        "resolve_workers": args.resolve_workers,
+        "cipher_suite": CIPHER_SUITES[args.cipher_suite](),
+        "label_encoding": args.label_encoding,
+    }
+    trapdoor_kwargs = {"max_segments": args.max_segments} if args.max_segments else {}
+    # The options that change the built index; an index saved with other options is rebuilt.
+    index_options = None if not args.reuse_index else {
+        "label_version": args.label_version,
+        "storage": args.storage,
+        "block_size": args.block_size,
+        "cipher_suite": args.cipher_suite,
+        "label_encoding": args.label_encoding,
+        "tree": args.tree,
+        "lazy_tree": args.lazy_tree,
+        "dataset": dataset_fingerprint(dataset),
+    }
+    run_benchmark(report_name, scheme, dimensions, dataset, args.queries_count, args.domain_size, engine_kwargs, trapdoor_kwargs,
+                  args.query_workers or None, index_artifact, index_options, args.concurrency,
+                  args.trace_memory)
@@ -0,0 +1,89 @@
+import secrets
+import time
+
+from cryptography.hazmat.primitives import padding as sym_padding
+from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+
+from ers.util.crypto.cipher_suite import CIPHER_SUITES
+from ers.util.crypto.crypto import (
+    CTR_NONCE_BYTES,
+    SymmetricEncrypt,
+    SymmetricDecrypt,
+    SymmetricEncryptBatch,
+    SymmetricDecryptBatch,
+    SymmetricEncryptCTR,
+    SymmetricDecryptCTR,
+    SymmetricEncryptCTRBatch,
+    SymmetricDecryptCTRBatch,
+)
+
+
+def reference_cbc(key: bytes, plaintext: bytes, iv: bytes) -> bytes:
+    # The format of SymmetricEncrypt, with a given IV.
+    padder = sym_padding.PKCS7(128).padder()
+    padded = padder.update(plaintext) + padder.finalize()
+    encryptor = Cipher(algorithms.AES(key), modes.CBC(iv)).encryptor()
+    return encryptor.update(padded) + encryptor.finalize() + iv
+
+
+def reference_ctr(key: bytes, plaintext: bytes, nonce: bytes) -> bytes:
+    # The format of SymmetricEncryptCTR, with a given nonce.
+    encryptor = Cipher(algorithms.AES(key), modes.CTR(nonce + bytes(16 - CTR_NONCE_BYTES))).encryptor()
+    return encryptor.update(plaintext) + encryptor.finalize() + nonce
+
+
+if __name__ == "__main__":
+    # VARIABLES
+    # Empty values and exact multiples of the block size get a full block of padding in CBC and no key stream in CTR.
+    EDGE_LENGTHS = [0, 1, 15, 16, 17, 31, 32, 48, 64]
+    VALUES_COUNT = 20000
+    MAX_LENGTH = 100
+
+    key = secrets.token_bytes(16)
+    plaintexts = [secrets.token_bytes(n) for n in EDGE_LENGTHS]
+    plaintexts += [secrets.token_bytes(secrets.randbelow(MAX_LENGTH + 1)) for _ in range(VALUES_COUNT)]
+
+    # AES-CBC: the batch and single-value functions must produce and read the same format.
+    assert SymmetricEncryptBatch(key, []) == [] and SymmetricDecryptBatch(key, []) == []
+
+    t0 = time.perf_counter()
+    single = [SymmetricEncrypt(key, p) for p in plaintexts]
+    t1 = time.perf_counter()
+    batch = SymmetricEncryptBatch(key, plaintexts)
+    t2 = time.perf_counter()
+    single_decrypted = [SymmetricDecrypt(key, c) for c in batch]
+    t3 = time.perf_counter()
+    batch_decrypted = SymmetricDecryptBatch(key, single)
+    t4 = time.perf_counter()
+
+    assert all(c == reference_cbc(key, p, c[-16:]) for p, c in zip(plaintexts, batch))
+    assert single_decrypted == batch_decrypted == SymmetricDecryptBatch(key, batch) == plaintexts
+    print("AES-CBC: values per second")
+    print(f"  encrypt: single {len(plaintexts) / (t1 - t0):10.0f} | batch {len(plaintexts) / (t2 - t1):10.0f}")
+    print(f"  decrypt: single {len(plaintexts) / (t3 - t2):10.0f} | batch {len(plaintexts) / (t4 - t3):10.0f}")
+
+    # AES-CTR: the same checks, with the nonce appended instead of the IV.
+    assert SymmetricEncryptCTRBatch(key, []) == [] and SymmetricDecryptCTRBatch(key, []) == []
+
+    t0 = time.perf_counter()
+    single = [SymmetricEncryptCTR(key, p) for p in plaintexts]
+    t1 = time.perf_counter()
+    batch = SymmetricEncryptCTRBatch(key, plaintexts)
+    t2 = time.perf_counter()
+    single_decrypted = [SymmetricDecryptCTR(key, c) for c in batch]
+    t3 = time.perf_counter()
+    batch_decrypted = SymmetricDecryptCTRBatch(key, single)
+    t4 = time.perf_counter()
+
+    assert all(c == reference_ctr(key, p, c[-CTR_NONCE_BYTES:]) for p, c in zip(plaintexts, batch))
+    assert single_decrypted == batch_decrypted == SymmetricDecryptCTRBatch(key, batch) == plaintexts
+    print("AES-CTR: values per second")
+    print(f"  encrypt: single {len(plaintexts) / (t1 - t0):10.0f} | batch {len(plaintexts) / (t2 - t1):10.0f}")
+    print(f"  decrypt: single {len(plaintexts) / (t3 - t2):10.0f} | batch {len(plaintexts) / (t4 - t3):10.0f}")
+
+    # The suites of the engine round-trip through their batch functions.
+    print("Cipher suites:")
+    for name, suite in CIPHER_SUITES.items():
+        suite = suite()
+        assert suite.decrypt_batch(key, suite.encrypt_batch(key, plaintexts)) == plaintexts
+        print(f"  {name}: average ciphertext size {sum(len(c) for c in suite.encrypt_batch(key, plaintexts)) / len(plaintexts):6.1f} bytes")
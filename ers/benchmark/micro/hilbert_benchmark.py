@@ -0,0 +1,50 @@
+import itertools
+import secrets
+import time
+
+from ers.structures.hilbert_curve import HilbertCurve, MIN_VECTORIZED_BATCH
+from ers.structures.hyperrange import HyperRange
+from ers.structures.point import Point
+
+if __name__ == "__main__":
+    # VARIABLES
+    CURVES = [(16, 2), (32, 2), (21, 3), (40, 2), (64, 2)]
+    POINTS_COUNT = 100000
+    # Too many dimensions to learn the states of the curve: the covers decode the prefixes of the blocks.
+    SMALL_CURVE = (2, 6)
+
+    # Batches from the vectorization threshold up round-trip like the scalar conversions.
+    hc = HilbertCurve(4, 2)
+    for count in (MIN_VECTORIZED_BATCH, MIN_VECTORIZED_BATCH + 1, 1 << 8):
+        points = [Point([secrets.randbelow(1 << 4) for _ in range(2)]) for _ in range(count)]
+        assert hc.points_from_distances(hc.distances_from_points(points)) == points
+    assert hc.points_from_distances(range(1 << 8)) == [hc.point_from_distance(d) for d in range(1 << 8)]
+
+    # The covers of a curve in 6 dimensions match the distances of all the cells of the range.
+    order, dimensions = SMALL_CURVE
+    hc = HilbertCurve(order, dimensions)
+    rng = HyperRange(Point([0, 1, 0, 2, 1, 0]), Point([2, 3, 1, 3, 1, 3]))
+    cells = sorted(hc.distance_from_point(Point(list(c)))
+                   for c in itertools.product(*(range(s, e + 1) for s, e in zip(rng.start.as_tuple(), rng.end.as_tuple()))))
+    assert hc.src(rng) == (cells[0], cells[-1])
+    assert [d for start, end in hc.brc(rng) for d in range(start, end + 1)] == cells
+
+    for order, dimensions in CURVES:
+        hc = HilbertCurve(order, dimensions)
+        points = [Point([secrets.randbelow(2 ** order) for _ in range(dimensions)]) for _ in range(POINTS_COUNT)]
+
+        t0 = time.perf_counter()
+        scalar_distances = [hc.distance_from_point(p) for p in points]
+        t1 = time.perf_counter()
+        distances = hc.distances_from_points(points)
+        t2 = time.perf_counter()
+        scalar_points = [hc.point_from_distance(d) for d in distances]
+        t3 = time.perf_counter()
+        decoded = hc.points_from_distances(distances)
+        t4 = time.perf_counter()
+
+        assert distances == scalar_distances
+        assert decoded == scalar_points == points
+        print(f"Curve of order {order} in {dimensions} dimensions: points per second")
+        print(f"  encode: scalar {POINTS_COUNT / (t1 - t0):12.0f} | vectorized {POINTS_COUNT / (t2 - t1):12.0f}")
+        print(f"  decode: scalar {POINTS_COUNT / (t3 - t2):12.0f} | vectorized {POINTS_COUNT / (t4 - t3):12.0f}")
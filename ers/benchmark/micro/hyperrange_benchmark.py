@@ -0,0 +1,31 @@
+import time
+
+from ers.benchmark.micro.tree_benchmark import random_queries, time_operation
+from ers.benchmark.util.dataset_generator import generate_cali, generate_spitz, generate_nh_64
+from ers.structures.hyperrange import HyperRange
+from ers.structures.hyperrange_tree import HyperRangeTree
+from ers.structures.point import Point
+from ers.util.hyperrange.uniform_split_divider import UniformSplitDivider
+
+if __name__ == "__main__":
+    # VARIABLES (run from the repository root, as the datasets are read from ./data)
+    DATASETS = {
+        "spitz": (lambda: generate_spitz(7, 1000000), [7, 7]),
+        "cali": (lambda: generate_cali(7, 1000000), [7, 7]),
+        "nh_64": (lambda: generate_nh_64(), [6, 6, 6]),
+    }
+    QUERIES_COUNT = 200
+
+    for name, (generator, bits) in DATASETS.items():
+        points = [Point(list(t)) for t in generator().keys()]
+
+        t0 = time.perf_counter()
+        tree = HyperRangeTree.init(HyperRange.from_bits(bits), UniformSplitDivider(2))
+        t1 = time.perf_counter()
+
+        queries = random_queries(bits, QUERIES_COUNT)
+
+        print(f"Dataset {name} ({len(points)} points, domain {bits}):")
+        print(f"  tree construction: {(t1 - t0) * 1e3:10.1f} ms")
+        print(f"  descend per point: {time_operation(tree.descend, points):10.1f} us")
+        print(f"  rc per query:      {time_operation(tree.rc, queries):10.1f} us")
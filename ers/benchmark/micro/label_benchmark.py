@@ -0,0 +1,39 @@
+import time
+
+from ers.benchmark.micro.tree_benchmark import random_queries
+from ers.structures.hyperrange import HyperRange, LABEL_ENCODINGS, BINARY_LABEL_MAX_DIMENSIONS, BINARY_LABEL_MAX_WIDTH
+
+if __name__ == "__main__":
+    # VARIABLES
+    DOMAINS = [[16], [16, 16], [32, 32], [21, 21, 21]]
+    LABELS_COUNT = 100000
+
+    # The number of dimensions and the width of the coordinates are limited by the one-byte fields of binary labels.
+    widest = 2 ** (8 * BINARY_LABEL_MAX_WIDTH) - 1
+    for rng in (HyperRange.from_coords([0] * BINARY_LABEL_MAX_DIMENSIONS, [2 ** 70] * BINARY_LABEL_MAX_DIMENSIONS),
+                HyperRange.from_coords([0], [widest])):
+        assert HyperRange.from_bytes(rng.to_binary()) == rng
+    for rng in (HyperRange.from_coords([0] * (BINARY_LABEL_MAX_DIMENSIONS + 1), [1] * (BINARY_LABEL_MAX_DIMENSIONS + 1)),
+                HyperRange.from_coords([0], [widest + 1])):
+        try:
+            rng.to_binary()
+            raise AssertionError("The binary label should have been rejected")
+        except ValueError:
+            pass
+
+    for bits in DOMAINS:
+        print(f"Domain {bits}: average microseconds per label")
+        for encoding in LABEL_ENCODINGS:
+            # Fresh ranges for every encoding, as ranges cache their serialized bytes.
+            ranges = random_queries(bits, LABELS_COUNT)
+
+            t0 = time.perf_counter()
+            labels = [r.to_bytes(encoding) for r in ranges]
+            t1 = time.perf_counter()
+            decoded = [HyperRange.from_bytes(label) for label in labels]
+            t2 = time.perf_counter()
+
+            assert decoded == ranges
+            print(f"  {encoding:>8}: encode {(t1 - t0) / LABELS_COUNT * 1e6:6.2f}"
+                  f" | decode {(t2 - t1) / LABELS_COUNT * 1e6:6.2f}"
+                  f" | size {sum(len(label) for label in labels) / LABELS_COUNT:6.1f} bytes")
@@ -0,0 +1,62 @@
+import time
+
+from ers.benchmark.micro.tree_benchmark import random_queries
+from ers.benchmark.util.dataset_generator import generate_dense_database_2d
+from ers.schemes.common.emm_engine import EMMEngine
+from ers.schemes.hilbert.quad_brc_hilbert import QuadBRCHilbert
+from ers.schemes.hilbert.quad_src_hilbert import QuadSRCHilbert
+from ers.schemes.hilbert.tdag_src_hilbert import TdagSRCHilbert
+from ers.schemes.tdag_src import TdagSRC
+from ers.structures.hyperrange_tree import HyperRangeTree
+from ers.structures.lazy_hyperrange_tree import LazyHyperRangeTree
+from ers.structures.point import Point
+from ers.util.profiling.build_profiler import COUNT_LABELS, COUNT_VALUES
+
+if __name__ == "__main__":
+    # VARIABLES
+    DOMAIN_BITS = 3
+    SCHEMES = {
+        "tdag_src": TdagSRC,
+        "tdag_src_hilbert": TdagSRCHilbert,
+        "quad_brc_hilbert": QuadBRCHilbert,
+        "quad_src_hilbert": QuadSRCHilbert,
+    }
+    QUERIES_COUNT = 100
+    # The (labels, values) of the index of every point of the 8x8 domain, built with materialized and lazy trees.
+    # In the mid-overlap trees of the TDAG schemes a node is reachable through several parents: the materialized
+    # tree stores a value once per path to a label, the lazy tree once per label. The uniform trees have one path.
+    EXPECTED_COUNTS = {
+        "tdag_src": {HyperRangeTree: (361, 3136), LazyHyperRangeTree: (361, 1764)},
+        "tdag_src_hilbert": {HyperRangeTree: (184, 1816), LazyHyperRangeTree: (184, 706)},
+        "quad_brc_hilbert": {HyperRangeTree: (85, 256), LazyHyperRangeTree: (85, 256)},
+        "quad_src_hilbert": {HyperRangeTree: (85, 256), LazyHyperRangeTree: (85, 256)},
+    }
+
+    dataset = {Point(list(p)): values for p, values in generate_dense_database_2d(DOMAIN_BITS, 2 ** (2 * DOMAIN_BITS)).items()}
+    queries = random_queries([DOMAIN_BITS, DOMAIN_BITS], QUERIES_COUNT)
+
+    for name, scheme_class in SCHEMES.items():
+        print(f"Scheme {name}:")
+        results = {}
+        for tree_class in (HyperRangeTree, LazyHyperRangeTree):
+            scheme = scheme_class(EMMEngine([DOMAIN_BITS, DOMAIN_BITS], 2), tree_class=tree_class)
+            key = scheme.setup(16)
+
+            t0 = time.perf_counter()
+            scheme.build_index(key, dataset)
+            t1 = time.perf_counter()
+            trapdoors = [scheme.trapdoor(key, q) for q in queries]
+            t2 = time.perf_counter()
+            encrypted = [scheme.search(t) for t in trapdoors]
+
+            counts = scheme.emm_engine.profiler.counts
+            assert (counts[COUNT_LABELS], counts[COUNT_VALUES]) == EXPECTED_COUNTS[name][tree_class]
+            results[tree_class] = [scheme.resolve(key, e) for e in encrypted]
+
+            print(f"  {tree_class.__name__:>18}: build {(t1 - t0) * 1e3:8.1f} ms"
+                  f" | trapdoor {(t2 - t1) / len(queries) * 1e6:8.1f} us"
+                  f" | labels {counts[COUNT_LABELS]:5d} | values {counts[COUNT_VALUES]:5d}"
+                  f" | average search count {sum(len(e) for e in encrypted) / len(encrypted):6.1f}")
+
+        # Both trees find the same records.
+        assert results[HyperRangeTree] == results[LazyHyperRangeTree]
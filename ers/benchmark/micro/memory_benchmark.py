@@ -0,0 +1,24 @@
+import sys
+
+from ers.benchmark.util.memory_util import deep_sizeof
+from ers.structures.hyperrange import HyperRange
+from ers.structures.point import Point
+
+if __name__ == "__main__":
+    # VARIABLES
+    DIMENSIONS = [1, 2, 3, 10, 100, 1000]
+
+    previous_point, previous_range = 0, 0
+    print("Deep size in bytes:")
+    for d in DIMENSIONS:
+        point = Point(list(range(d)))
+        rng = HyperRange(Point([0] * d), Point([1 << 20] * d))
+        point_size, range_size = deep_sizeof(point), deep_sizeof(rng)
+
+        # The private slots are followed, so the coordinates are counted and the sizes grow with the dimension.
+        assert point_size >= sys.getsizeof(point) + sys.getsizeof(point.as_tuple())
+        assert range_size >= deep_sizeof(rng.start) + deep_sizeof(rng.end)
+        assert point_size > previous_point and range_size > previous_range
+        previous_point, previous_range = point_size, range_size
+
+        print(f"  {d:5d} dimensions: point {point_size:8d} | hyperrange {range_size:8d}")
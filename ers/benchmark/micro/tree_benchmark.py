@@ -0,0 +1,88 @@
+import secrets
+import time
+from typing import Callable, List
+
+from ers.structures.dyadic_hyperrange_tree import DyadicHyperRangeTree
+from ers.structures.hyperrange import HyperRange
+from ers.structures.hyperrange_tree import HyperRangeTree
+from ers.structures.lazy_hyperrange_tree import LazyHyperRangeTree
+from ers.util.hyperrange.data_dependent_split_divider import DataDependentSplitDivider
+from ers.util.hyperrange.uniform_split_divider import UniformSplitDivider
+
+
+def random_queries(bits: List[int], count: int) -> List[HyperRange]:
+    """
+    Generates random queries within the domain given by the bit lengths.
+
+    :param bits: The bit length of each dimension.
+    :param count: The number of queries.
+    :return: A list of HyperRanges.
+    """
+    queries = []
+    for _ in range(count):
+        a = [secrets.randbelow(2 ** b) for b in bits]
+        b = [secrets.randbelow(2 ** b) for b in bits]
+        queries.append(HyperRange.from_coords([min(x, y) for x, y in zip(a, b)], [max(x, y) for x, y in zip(a, b)]))
+    return queries
+
+
+def time_operation(operation: Callable[[HyperRange], object], queries: List[HyperRange], repeat: int = 5) -> float:
+    """
+    Measures the average time of an operation over the given queries, keeping the best of several runs
+    so that the comparisons are not skewed by the noise of the machine.
+
+    :param operation: The tree operation to measure.
+    :param queries: The queries passed to the operation.
+    :param repeat: The number of runs over all the queries.
+    :return: The average time per query, in microseconds.
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for q in queries:
+            operation(q)
+        best = min(best, time.perf_counter() - start)
+    return best / len(queries) * 1e6
+
+
+if __name__ == "__main__":
+    # VARIABLES
+    DOMAINS = [[10], [16], [5, 5], [7, 7], [4, 4, 4]]
+    QUERIES_COUNT = 200
+
+    for bits in DOMAINS:
+        root = HyperRange.from_bits(bits)
+        trees = {
+            "generic": HyperRangeTree.init(root, UniformSplitDivider(2)) if sum(bits) <= 16 else None,
+            "lazy": LazyHyperRangeTree.init(root, UniformSplitDivider(2)),
+            "dyadic": DyadicHyperRangeTree.init(root, UniformSplitDivider(2)),
+        }
+        queries = random_queries(bits, QUERIES_COUNT)
+        points = [HyperRange.from_point(q.start) for q in queries]
+
+        for reference in (trees["generic"], trees["lazy"]):
+            if reference is None:
+                continue
+            for q, p in zip(queries, points):
+                assert reference.brc(q) == trees["dyadic"].brc(q)
+                assert reference.src(q) == trees["dyadic"].src(q)
+                assert reference.descend(p) == trees["dyadic"].descend(p)
+
+        print(f"Domain {bits}: average microseconds per query")
+        for name, tree in trees.items():
+            if tree is None:
+                print(f"  {name:>8}: skipped (domain too large to materialize)")
+                continue
+            print(f"  {name:>8}: descend {time_operation(tree.descend, points):10.1f}"
+                  f" | src {time_operation(tree.src, queries):10.1f}"
+                  f" | brc {time_operation(tree.brc, queries):10.1f}")
+
+    # The data-dependent divider only keeps the points of every node while the tree is built,
+    # so the divisions made by the queries afterwards do not grow it.
+    bits = [5, 5]
+    divider = DataDependentSplitDivider(2, {q.start: [b""] for q in random_queries(bits, QUERIES_COUNT)})
+    tree = HyperRangeTree.init(HyperRange.from_bits(bits), divider)
+    assert not divider.partitions
+    for q in random_queries(bits, QUERIES_COUNT):
+        tree.urc(q)
+    assert not divider.partitions
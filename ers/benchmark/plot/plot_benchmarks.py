@@ -7,7 +7,14 @@ import sys
 
 app = dash.Dash(__name__, suppress_callback_exceptions=False)
 
-QUERYLESS_METRICS = {"index_size", "index_time"}
+QUERYLESS_METRICS = {"index_size", "index_time", "index_labels_per_second", "index_values_per_second", "tree_size", "index_load_time", "throughput",
+                     "index_disk_size", "index_memory_size", "client_memory_size", "build_peak_memory"}
+QUERYLESS_METRICS |= {f"build_{phase}_time" for phase in ("hilbert_mapping", "tree_construction", "descend_and_label", "encryption")}
+QUERYLESS_METRICS |= {f"build_{name}_count" for name in ("nodes", "labels", "values", "hashes")}
+# Metrics whose first column is the number of concurrent clients rather than the query size.
+CLIENT_METRICS = {"closed_loop_throughput"}
+# Raw samples and distributions, which are not one value per query size.
+SKIPPED_SHEETS = {"query_samples", "query_time_histogram"}
 
 # --- Load Data ---
 def split_scheme_and_dataset(parts):
@@ -40,9 +47,14 @@ def load_all_data(root_folder):
 
                 sheets = pd.read_excel(path, header=None, sheet_name=None, engine="openpyxl")
                 for metric, df in sheets.items():
-                    if df.empty:
+                    if df.empty or metric in SKIPPED_SHEETS:
                         continue
-                    if df.shape[1] >= 2:
+                    if metric in CLIENT_METRICS:
+                        df = df.iloc[:, :2]
+                        df.columns = ["clients", metric]
+                        df = df.dropna()
+                        df["query_size"] = None
+                    elif df.shape[1] >= 2:
                         df = df.iloc[:, :2]
                         df.columns = ["query_size", metric]
                         df = df.dropna()
@@ -150,6 +162,8 @@ def toggle_input_visibility(metric):
         return {"display": "none"}, {"display": "none"}, {"display": "none"}
     if metric in QUERYLESS_METRICS:
         return {"display": "none"}, {"display": "none"}, {"display": "block"}
+    if metric in CLIENT_METRICS:
+        return {"display": "none"}, {"display": "block"}, {"display": "block"}
     return {"display": "block"}, {"display": "block"}, {"display": "block"}
 
 # --- Update secondary filter options ---
@@ -160,10 +174,10 @@ def toggle_input_visibility(metric):
     Input("metric-filter", "value")
 )
 def update_secondary_options(xaxis, dataset, metric):
-    if not dataset or not metric or not xaxis:
+    if not dataset or not metric or not (xaxis or metric in CLIENT_METRICS):
         return []
     filtered = data[data["dataset"] == dataset]
-    if xaxis == "query_size":
+    if xaxis == "query_size" or metric in CLIENT_METRICS:
         domain_rows = filtered[["domain_size", "dim", "bits"]].drop_duplicates()
         domain_rows["label"] = domain_rows.apply(
             lambda r: f"2^{r['dim'] * r['bits']} (dim={r['dim']}, bits={r['bits']})", axis=1
@@ -209,6 +223,19 @@ def update_plot(schemes, dataset, metric, xaxis, yscale, secondary):
         fig.update_layout(yaxis_type=yscale or "linear")
         return fig
 
+    if metric in CLIENT_METRICS:
+        if not secondary:
+            return px.line(title="Waiting for full selection...")
+        filtered = filtered[filtered["domain_size"] == secondary]
+        filtered = filtered.sort_values("clients")
+        fig = px.line(
+            filtered, x="clients", y=metric, color="scheme", markers=True,
+            title=f"{metric.replace('_',' ').title()} vs Concurrent Clients"
+        )
+        fig.update_xaxes(type="log")
+        fig.update_layout(yaxis_type=yscale or "linear")
+        return fig
+
     if not all([xaxis, secondary]):
         return px.line(title="Waiting for full selection...")
 
@@ -0,0 +1,92 @@
+import hashlib
+import os
+import pickle
+from typing import Dict, List, Optional, Tuple
+
+from ers.structures.point import Point
+
+# Bumped whenever the layout of the artifact or of the pickled schemes changes, so that stale artifacts are rebuilt.
+INDEX_ARTIFACT_VERSION = 4
+
+
+def save_index(path: str, scheme, key: bytes, build_time: float, options: Dict) -> None:
+    """
+    Saves a built scheme, i.e. its encrypted index and its client state (trees or Hilbert curve), with its key.
+    File-backed storages are saved by path, so their index files must be kept next to the artifact; the size and
+    modification time of the index file are recorded, so that the artifact is rejected once the file changes.
+
+    :param path: The path of the artifact.
+    :param scheme: The built scheme.
+    :param key: The key the index was built with.
+    :param build_time: The time it took to build the index.
+    :param options: The options the index was built with, checked when the artifact is loaded.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    # The header is pickled on its own, so that a stale artifact is rejected without loading its scheme.
+    header = {
+        "version": INDEX_ARTIFACT_VERSION,
+        "options": options,
+        "index_file": index_file_fingerprint(getattr(scheme.encrypted_db, "path", None)),
+    }
+    with open(path, "wb") as file:
+        pickle.dump(header, file, protocol=pickle.HIGHEST_PROTOCOL)
+        pickle.dump((scheme, key, build_time), file, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def load_index(path: str, options: Dict) -> Optional[Tuple[object, bytes, float]]:
+    """
+    Loads a built scheme saved by `save_index`.
+
+    :param path: The path of the artifact.
+    :param options: The options the index must have been built with.
+    :return: The scheme, its key and its build time, or None if there is no artifact, if it has another version,
+             if it was built with other options or if its index file is missing or was changed since.
+    """
+    if not os.path.exists(path):
+        return None
+
+    with open(path, "rb") as file:
+        try:
+            header = pickle.load(file)
+        except (pickle.UnpicklingError, EOFError):
+            return None
+        if not isinstance(header, dict) or header.get("version") != INDEX_ARTIFACT_VERSION \
+                or header.get("options") != options:
+            return None
+
+        index_file = header["index_file"]
+        if index_file is not None and index_file != index_file_fingerprint(index_file["path"]):
+            return None
+
+        scheme, key, build_time = pickle.load(file)
+
+    return scheme, key, build_time
+
+
+def index_file_fingerprint(path: Optional[str]) -> Optional[Dict]:
+    """
+    Identifies the state of the index file of a file-backed storage.
+
+    :param path: The path of the index file, or None for in-memory storages.
+    :return: The path, size and modification time of the file, or None if there is no path or no file.
+    """
+    if path is None or not os.path.exists(path):
+        return None
+
+    stat = os.stat(path)
+    return {"path": path, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def dataset_fingerprint(dataset: Dict[Point, List[bytes]]) -> str:
+    """
+    Computes a digest of a dataset, so that an index is not reused for a dataset it was not built from
+    (e.g., the randomly generated ones).
+
+    :param dataset: The plaintext multi-map.
+    :return: The hexadecimal SHA-256 digest of the sorted records.
+    """
+    digest = hashlib.sha256()
+    for point in sorted(dataset, key=Point.as_tuple):
+        digest.update(repr((point.as_tuple(), sorted(dataset[point]))).encode())
+    return digest.hexdigest()
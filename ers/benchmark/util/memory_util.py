@@ -0,0 +1,110 @@
+import os
+import pickle
+import sys
+import tracemalloc
+from array import array
+from typing import Any, Callable, List, Tuple, Type
+
+from ers.util.storage.storage import EncryptedIndexStorage
+
+
+def deep_sizeof(obj, exclude: Tuple[Type, ...] = ()) -> int:
+    """
+    Computes the memory used by an object and by every object reachable from it.
+    Objects shared along several references are counted once.
+
+    :param obj: The object to measure.
+    :param exclude: Types whose instances are neither counted nor followed.
+    :return: The size in bytes.
+    """
+    size = 0
+    seen = set()
+    stack = [obj]
+
+    while stack:
+        o = stack.pop()
+        if id(o) in seen or isinstance(o, exclude):
+            continue
+        seen.add(id(o))
+        size += sys.getsizeof(o)
+
+        if isinstance(o, (str, bytes, bytearray, int, float, array)):
+            continue
+        if isinstance(o, dict):
+            stack.extend(o.keys())
+            stack.extend(o.values())
+        elif isinstance(o, (list, tuple, set, frozenset)):
+            stack.extend(o)
+
+        if hasattr(o, "__dict__"):
+            stack.append(o.__dict__)
+        for slot in _slot_names(type(o)):
+            if hasattr(o, slot):
+                stack.append(getattr(o, slot))
+
+    return size
+
+
+def _slot_names(cls: type) -> List[str]:
+    """
+    Lists the attribute names of the slots of a class and of its bases, with the private slots under their
+    mangled names (e.g., "__coords" of Point is stored as "_Point__coords").
+
+    :param cls: The class.
+    :return: The names of its slots.
+    """
+    names = []
+    for klass in cls.__mro__:
+        slots = klass.__dict__.get("__slots__", ())
+        for slot in (slots,) if isinstance(slots, str) else slots:
+            if slot.startswith("__") and not slot.endswith("__"):
+                slot = f"_{klass.__name__.lstrip('_')}{slot}"
+            names.append(slot)
+    return names
+
+
+class _ByteCounter:
+    """
+    A write-only file object that counts the bytes written to it.
+    """
+
+    def __init__(self):
+        self.size = 0
+
+    def write(self, b) -> int:
+        self.size += len(b)
+        return len(b)
+
+
+def serialized_size(storage: EncryptedIndexStorage) -> int:
+    """
+    Computes the size of an encrypted index on disk: the size of its file for the file-backed storages,
+    or the size of its pickled entries for the in-memory ones, without holding the pickled bytes in memory.
+
+    :param storage: The storage of the encrypted index.
+    :return: The size in bytes.
+    """
+    path = getattr(storage, "path", None)
+    if path is not None and os.path.exists(path):
+        return os.path.getsize(path)
+
+    counter = _ByteCounter()
+    pickle.dump(dict(storage.items()), counter, protocol=pickle.HIGHEST_PROTOCOL)
+    return counter.size
+
+
+def traced_peak(fn: Callable[..., Any], *args, **kwargs) -> Tuple[Any, int]:
+    """
+    Calls a function while tracing the memory allocations of the Python interpreter.
+    Tracing slows the function down, and the allocations of child processes are not traced.
+
+    :param fn: The function to call.
+    :return: The result of the function and the peak of the memory traced during the call, in bytes.
+    """
+    tracemalloc.start()
+    try:
+        result = fn(*args, **kwargs)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return result, peak
@@ -0,0 +1,49 @@
+from typing import List, Sequence, Tuple
+
+import numpy as np
+
+# The latency percentiles reported per bucket, by sheet suffix.
+PERCENTILES = (("p50", 50), ("p95", 95), ("p99", 99), ("max", 100))
+HISTOGRAM_BINS = 20
+
+
+def percentiles(samples: Sequence[float]) -> List[float]:
+    """
+    Computes the reported percentiles of a list of samples, interpolating linearly between the closest ranks.
+
+    :param samples: A non-empty list of samples.
+    :return: The values of the percentiles, in the order of PERCENTILES.
+    """
+    return np.percentile(np.asarray(samples, dtype=float), [q for _, q in PERCENTILES]).tolist()
+
+
+def histogram(samples: Sequence[float], bins: int = HISTOGRAM_BINS) -> List[Tuple[float, int]]:
+    """
+    Counts the samples in logarithmically spaced bins between the smallest and the largest sample,
+    as latencies typically span several orders of magnitude.
+
+    :param samples: A non-empty list of positive samples.
+    :param bins: The number of bins.
+    :return: The upper bound and the number of samples of every bin.
+    """
+    samples = np.asarray(samples, dtype=float)
+    low, high = samples.min(), samples.max()
+    if low == high:
+        return [(float(high), len(samples))]
+
+    edges = np.geomspace(low, high, bins + 1) if low > 0 else np.linspace(low, high, bins + 1)
+
+    counts, edges = np.histogram(samples, bins=edges)
+    return list(zip(edges[1:].tolist(), counts.tolist()))
+
+
+def throughput(started: Sequence[float], finished: Sequence[float]) -> float:
+    """
+    Computes the number of operations per second from their start and finish wall-clock times.
+
+    :param started: The times at which the operations started.
+    :param finished: The times at which the operations finished.
+    :return: The number of operations divided by the time between the first start and the last finish.
+    """
+    elapsed = max(finished) - min(started)
+    return len(started) / elapsed if elapsed > 0 else float("inf")
@@ -25,6 +25,17 @@ class XLSXUtil:
 
         self.workbook.save(self.filename)
 
+    def write_rows(self, page_name, rows):
+        if page_name in self.workbook.sheetnames:
+            sheet = self.workbook[page_name]
+        else:
+            sheet = self.workbook.create_sheet(title=page_name)
+
+        for row in rows:
+            sheet.append(row)
+
+        self.workbook.save(self.filename)
+
     def close(self):
         self.workbook.save(self.filename)
         self.workbook.close()
@@ -1,6 +1,6 @@
 from .emm_engine import EMMEngine
 
-from typing import Set
+from typing import Iterable, Iterator, Set
 
 
 class EMM:
@@ -17,6 +17,7 @@ class EMM:
         """
         self.emm_engine = emm_engine
         self.dimensions = emm_engine.dimensions
+        self.encrypted_db = None
 
     def setup(self, security_parameter: int) -> bytes:
         """
@@ -27,12 +28,35 @@ class EMM:
         """
         return self.emm_engine.setup(security_parameter)
 
-    def resolve(self, key: bytes, results: Set[bytes]) -> Set[bytes]:
+    def search(self, trapdoors: Iterable[bytes]) -> Set[bytes]:
+        """
+        Searches for encrypted values corresponding to the given trapdoor tokens.
+
+        :param trapdoors: A set of search tokens.
+        :return: A set of encrypted results from the secure index.
+        """
+        return set(self.search_iter(trapdoors))
+
+    def search_iter(self, trapdoors: Iterable[bytes]) -> Iterator[bytes]:
+        """
+        Lazily yields the encrypted values corresponding to the given trapdoor tokens, as they are found.
+        The iterator can be passed directly to `resolve` to decrypt the results while the search is running.
+
+        :param trapdoors: A set of search tokens.
+        :return: An iterator of encrypted results from the secure index.
+        :raises ValueError: If the index is not built yet.
+        """
+        if self.encrypted_db is None:
+            raise ValueError("Index is not built yet!")
+
+        return (ct_value for trapdoor in trapdoors for ct_value in self.emm_engine.search_iter(trapdoor, self.encrypted_db))
+
+    def resolve(self, key: bytes, results: Iterable[bytes]) -> Set[bytes]:
         """
         Decrypts search results using the provided key.
 
         :param key: The secret key used for decryption.
-        :param results: A set of encrypted values retrieved from the index.
+        :param results: The encrypted values retrieved from the index, as a set or as returned by `search_iter`.
         :return: A set of decrypted plaintext values.
         """
         return self.emm_engine.resolve(key, results)
\ No newline at end of file
@@ -1,18 +1,40 @@
+import struct
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from itertools import islice, repeat
+
+from ers.structures.hyperrange import HyperRange, LABEL_ENCODING_JSON, LABEL_ENCODINGS
+from ers.util.crypto.cipher_suite import CipherSuite, CBCCipherSuite
 from ers.util.crypto.crypto import (
     SecureRandom,
     HashKDF,
     HMAC,
+    HMACBatch,
     Hash,
-    SymmetricEncrypt,
-    SymmetricDecrypt,
 )
+from ers.util.profiling.build_profiler import BuildProfiler, PHASE_ENCRYPTION, COUNT_LABELS, COUNT_VALUES, COUNT_HASHES
+from ers.util.storage.dict_storage import DictStorage
+from ers.util.storage.storage import EncryptedIndexStorage
 
-from typing import List, Dict, Set
+from typing import List, Dict, Set, Tuple, Iterable, Iterator, Callable
 from tqdm import tqdm
 
 PURPOSE_HMAC = "hmac"
 PURPOSE_ENCRYPT = "encryption"
 
+# Entry labels are derived as Hash(token + counter). The legacy derivation encodes the counter as a
+# zero-filled buffer of length `index`, which makes the cost of an entry grow with its list position.
+# The counter derivation encodes it as a fixed-width big-endian integer.
+LABEL_VERSION_LEGACY = 0
+LABEL_VERSION_COUNTER = 1
+
+COUNTER_BYTES = 8
+
+# Layout of a packed posting list block: the number of blocks of the list, followed by `block_size`
+# length-prefixed ciphertext slots. Unused slots of the last block have length 0.
+BLOCK_HEADER = struct.Struct(">I")
+SLOT_HEADER = struct.Struct(">I")
+
 DO_NOT_ENCRYPT = False
 
 
@@ -25,20 +47,74 @@ class EMMEngine:
     generating trapdoors for queries, and resolving search results.
     """
 
-    def __init__(self, dimension_bits: List[int], dimensions: int):
+    def __init__(self, dimension_bits: List[int], dimensions: int, build_workers: int = 1, build_batch_size: int = 1024,
+                 label_version: int = LABEL_VERSION_COUNTER, storage: Callable[[], EncryptedIndexStorage] = DictStorage,
+                 block_size: int = 0, resolve_workers: int = 1, resolve_batch_size: int = 1024,
+                 cipher_suite: CipherSuite = CBCCipherSuite(), label_encoding: str = LABEL_ENCODING_JSON,
+                 profiler: BuildProfiler = None):
         """
         Initializes the EMM engine with the specified dimensionality.
 
         :param dimension_bits: A list representing the bit-length of each dimension.
         :param dimensions: The total number of dimensions.
+        :param build_workers: The number of processes used to encrypt the index (1 builds it in-process).
+        :param build_batch_size: The number of labels encrypted together as one batch.
+        :param label_version: The derivation of the entry labels (LABEL_VERSION_LEGACY or LABEL_VERSION_COUNTER).
+        :param storage: A factory of the storage that holds a built index (e.g., DictStorage or a
+                        functools.partial of MmapStorage/SQLiteStorage with a file path).
+        :param block_size: If positive, the values of a label are stored as blocks of `block_size` packed
+                           ciphertexts, such that a search needs one lookup per block instead of one per value.
+        :param resolve_workers: The number of threads used to decrypt search results (1 decrypts them in the caller's thread).
+        :param resolve_batch_size: The number of search results decrypted together as one batch.
+        :param cipher_suite: The encryption of the values. An index must be resolved with the suite it was built with;
+                             the default AES-CBC suite keeps existing indexes readable.
+        :param label_encoding: The serialization of the range labels (LABEL_ENCODING_JSON or LABEL_ENCODING_BINARY).
+        :param profiler: The profiler in which the schemes using the engine time the phases of their builds
+                         (a new one if not given).
         :raises ValueError: If the specified bit lengths do not match the number of dimensions.
         """
         self.DIMENSIONS_BITS = dimension_bits
         self.dimensions = dimensions
+        self.build_workers = build_workers
+        self.build_batch_size = build_batch_size
+        self.label_version = label_version
+        self.storage = storage
+        self.block_size = block_size
+        self.resolve_workers = resolve_workers
+        self.resolve_batch_size = resolve_batch_size
+        self.cipher_suite = cipher_suite
+        self.label_encoding = label_encoding
+        self.build_stats = None
+        self.profiler = profiler if profiler is not None else BuildProfiler()
+        self._session = None
 
         if len(dimension_bits) != dimensions:
             raise ValueError("Specified dimensions bits do to not correspond to the number of dimensions")
 
+        if build_workers < 1 or build_batch_size < 1:
+            raise ValueError("The number of build workers and the build batch size must be positive")
+
+        if resolve_workers < 1 or resolve_batch_size < 1:
+            raise ValueError("The number of resolve workers and the resolve batch size must be positive")
+
+        if block_size < 0:
+            raise ValueError("The block size must not be negative")
+
+        if label_version not in (LABEL_VERSION_LEGACY, LABEL_VERSION_COUNTER):
+            raise ValueError(f"Unknown label version: {label_version}")
+
+        if label_encoding not in LABEL_ENCODINGS:
+            raise ValueError(f"Unknown label encoding: {label_encoding}")
+
+    def label(self, rng: HyperRange) -> bytes:
+        """
+        Serializes a range into the plaintext label of the multi-map, using the label encoding of the engine.
+
+        :param rng: The HyperRange to serialize.
+        :return: The label bytes.
+        """
+        return rng.to_bytes(self.label_encoding)
+
     def setup(self, security_parameter: int) -> bytes:
         """
         Generates a cryptographic key with a specified security parameter.
@@ -48,26 +124,64 @@ class EMMEngine:
         """
         return SecureRandom(security_parameter)
 
-    def build_index(self, key: bytes, plaintext_mm: Dict[bytes, List[bytes]]) -> Dict[bytes, bytes]:
+    def build_index(self, key: bytes, plaintext_mm: Dict[bytes, List[bytes]]) -> EncryptedIndexStorage:
         """
         Constructs an encrypted index from the given plaintext multi-map.
 
+        The labels are split into batches of `build_batch_size` which are encrypted either in-process or,
+        if `build_workers` is greater than 1, across a process pool. Throughput statistics of the last
+        build are available in `build_stats`.
+
         :param key: The secret key for encryption and authentication.
         :param plaintext_mm: A dictionary mapping labels to lists of plaintext values.
-        :return: A dictionary representing the encrypted index.
-        """
-        hmac_key = HashKDF(key, PURPOSE_HMAC)
-        enc_key = HashKDF(key, PURPOSE_ENCRYPT)
-
-        encrypted_db = {}
-        for label, values in tqdm(plaintext_mm.items()):
-            token = HMAC(hmac_key, label)
-            for index, value in enumerate(values):
-                ct_label = Hash(token + bytes(index))
-                ct_value = SymmetricEncrypt(enc_key, value)
-                encrypted_db[ct_label] = ct_value
+        :return: The encrypted index, held by a new storage created with the engine's storage factory.
+        """
+        session = self.session(key)
+        hmac_key = session.hmac_key
+        enc_key = session.enc_key
+
+        items = list(plaintext_mm.items())
+        batches = [items[i: i + self.build_batch_size] for i in range(0, len(items), self.build_batch_size)]
+
+        t0 = time.perf_counter()
+
+        with self.profiler.phase(PHASE_ENCRYPTION):
+            encrypted_db = self.storage()
+            encrypted_db.load(self._encrypt_batches(hmac_key, enc_key, batches))
+
+        t1 = time.perf_counter()
+
+        values = sum(len(values) for _, values in items)
+        self.build_stats = _build_stats(len(items), values, t1 - t0)
+
+        self.profiler.count(COUNT_LABELS, len(items))
+        self.profiler.count(COUNT_VALUES, values)
+        self.profiler.count(COUNT_HASHES, len(items) + len(encrypted_db))
+
         return encrypted_db
 
+    def _encrypt_batches(self, hmac_key: bytes, enc_key: bytes, batches: List[List[Tuple[bytes, List[bytes]]]]) -> Iterator[Tuple[bytes, bytes]]:
+        """
+        Encrypts the batches of a plaintext multi-map, in-process or across a process pool.
+
+        :param hmac_key: The key used to derive the label tokens.
+        :param enc_key: The key used to encrypt the values.
+        :param batches: A list of batches of (label, values) pairs.
+        :return: An iterator of (ciphertext label, ciphertext value) pairs.
+        """
+        with tqdm(total=sum(len(batch) for batch in batches)) as progress:
+            if self.build_workers > 1 and len(batches) > 1:
+                with ProcessPoolExecutor(max_workers=self.build_workers) as executor:
+                    results = executor.map(_encrypt_batch, repeat(hmac_key), repeat(enc_key), batches,
+                                           repeat(self.label_version), repeat(self.block_size), repeat(self.cipher_suite))
+                    for batch, entries in zip(batches, results):
+                        yield from entries
+                        progress.update(len(batch))
+            else:
+                for batch in batches:
+                    yield from _encrypt_batch(hmac_key, enc_key, batch, self.label_version, self.block_size, self.cipher_suite)
+                    progress.update(len(batch))
+
     def trapdoor(self, key: bytes, label: bytes) -> bytes:
         """
         Generates a trapdoor (secure search token) for a given label.
@@ -76,10 +190,37 @@ class EMMEngine:
         :param label: The plaintext label for which the trapdoor is generated.
         :return: A secure token that can be used for searching.
         """
-        hmac_key = HashKDF(key, PURPOSE_HMAC)
-        return HMAC(hmac_key, label)
+        return self.session(key).trapdoor(label)
 
-    def search(self, search_token: bytes, encrypted_db: Dict[bytes, bytes]) -> Set[bytes]:
+    def trapdoors(self, key: bytes, labels: Iterable[bytes]) -> Set[bytes]:
+        """
+        Generates the trapdoors of many labels, deriving the HMAC key only once.
+
+        :param key: The secret key used for generating the trapdoors.
+        :param labels: The plaintext labels for which the trapdoors are generated.
+        :return: A set of secure tokens that can be used for searching.
+        """
+        return self.session(key).trapdoors(labels)
+
+    def session(self, key: bytes) -> "EMMKeySession":
+        """
+        Returns a session holding the subkeys derived from the given key. The last session is kept by the
+        engine, such that consecutive calls with the same key do not derive the subkeys again.
+
+        :param key: The secret key.
+        :return: An EMMKeySession for the key.
+        """
+        if self._session is None or self._session.key != key:
+            self._session = EMMKeySession(key)
+        return self._session
+
+    def __getstate__(self):
+        # The cached session holds key material and is never pickled along with the engine
+        state = self.__dict__.copy()
+        state["_session"] = None
+        return state
+
+    def search(self, search_token: bytes, encrypted_db: EncryptedIndexStorage) -> Set[bytes]:
         """
         Searches for encrypted values corresponding to a given search token.
 
@@ -87,28 +228,233 @@ class EMMEngine:
         :param encrypted_db: The encrypted index to search in.
         :return: A set of encrypted values matching the search token.
         """
-        results = set()
+        return set(self.search_iter(search_token, encrypted_db))
+
+    def search_iter(self, search_token: bytes, encrypted_db: EncryptedIndexStorage) -> Iterator[bytes]:
+        """
+        Lazily yields the encrypted values corresponding to a given search token, as they are found.
+
+        With packed posting lists, the first block tells how many blocks the list has, such that the search
+        does exactly one lookup per block.
+
+        :param search_token: The trapdoor token generated from a label.
+        :param encrypted_db: The encrypted index to search in.
+        :return: An iterator of encrypted values matching the search token.
+        """
+        if self.block_size > 0:
+            yield from self._search_blocks(search_token, encrypted_db)
+            return
+
         index = 0
         while True:
-            ct_label = Hash(search_token + bytes(index))
-            if ct_label in encrypted_db:
-                data = encrypted_db[ct_label]
-                results.add(data)
-            else:
+            ct_value = encrypted_db.get(_entry_label(search_token, index, self.label_version))
+            if ct_value is None:
                 break
+            yield ct_value
             index += 1
-        return results
 
-    def resolve(self, key: bytes, results: Set[bytes]) -> Set[bytes]:
+    def _search_blocks(self, search_token: bytes, encrypted_db: EncryptedIndexStorage) -> Iterator[bytes]:
+        """
+        Searches a packed posting list for a given search token.
+
+        :param search_token: The trapdoor token generated from a label.
+        :param encrypted_db: The encrypted index to search in.
+        :return: An iterator of encrypted values matching the search token.
+        """
+        block = encrypted_db.get(_entry_label(search_token, 0, self.label_version))
+        if block is None:
+            return
+
+        blocks, ct_values = _unpack_block(block)
+        yield from ct_values
+        for index in range(1, blocks):
+            _, ct_values = _unpack_block(encrypted_db[_entry_label(search_token, index, self.label_version)])
+            yield from ct_values
+
+    def resolve(self, key: bytes, results: Iterable[bytes]) -> Set[bytes]:
         """
         Decrypts search results using the provided key.
 
         :param key: The secret key used for decryption.
-        :param results: A set of encrypted values retrieved from the index.
+        :param results: The encrypted values retrieved from the index, either as a set or as the iterator
+                        returned by `search_iter`, in which case decryption starts while the search runs.
+                        They are decrypted in batches of `resolve_batch_size`, across `resolve_workers` threads.
         :return: A set of decrypted plaintext values.
         """
-        enc_key = HashKDF(key, PURPOSE_ENCRYPT)
+        enc_key = self.session(key).enc_key
+
+        results = iter(results)
+        batches = iter(lambda: list(islice(results, self.resolve_batch_size)), [])
+
         pt_values = set()
-        for ct_value in results:
-            pt_values.add(SymmetricDecrypt(enc_key, ct_value))
-        return pt_values
\ No newline at end of file
+        if self.resolve_workers > 1:
+            with ThreadPoolExecutor(max_workers=self.resolve_workers) as executor:
+                for plaintexts in executor.map(self.cipher_suite.decrypt_batch, repeat(enc_key), batches):
+                    pt_values.update(plaintexts)
+        else:
+            for batch in batches:
+                pt_values.update(self.cipher_suite.decrypt_batch(enc_key, batch))
+        return pt_values
+
+    def migrate_index(self, key: bytes, labels: Iterable[bytes], encrypted_db: EncryptedIndexStorage, from_version: int) -> EncryptedIndexStorage:
+        """
+        Re-derives the entry labels of an index built with another label version, so that it can be searched
+        by this engine. The ciphertext values are moved as they are, without being decrypted.
+
+        :param key: The secret key the index was built with.
+        :param labels: The plaintext labels of the index; entries of other labels are not carried over.
+        :param encrypted_db: The encrypted index built with `from_version`.
+        :param from_version: The label version the index was built with.
+        :return: The encrypted index under this engine's label version, held by a new storage.
+        """
+        hmac_key = self.session(key).hmac_key
+
+        def migrated_entries():
+            for label in tqdm(labels):
+                token = HMAC(hmac_key, label)
+                index = 0
+                while True:
+                    ct_value = encrypted_db.get(_entry_label(token, index, from_version))
+                    if ct_value is None:
+                        break
+                    yield _entry_label(token, index, self.label_version), ct_value
+                    index += 1
+
+        migrated_db = self.storage()
+        migrated_db.load(migrated_entries())
+        return migrated_db
+
+
+class EMMKeySession:
+    """
+    Holds the subkeys derived from a secret key, such that the HKDF cost is paid once per session
+    rather than once per trapdoor or per decryption.
+    """
+
+    def __init__(self, key: bytes):
+        """
+        Derives the subkeys of the given key.
+
+        :param key: The secret key.
+        """
+        self.key = key
+        self.hmac_key = HashKDF(key, PURPOSE_HMAC)
+        self.enc_key = HashKDF(key, PURPOSE_ENCRYPT)
+
+    def trapdoor(self, label: bytes) -> bytes:
+        """
+        Generates the trapdoor of a label.
+
+        :param label: The plaintext label.
+        :return: A secure token that can be used for searching.
+        """
+        return HMAC(self.hmac_key, label)
+
+    def trapdoors(self, labels: Iterable[bytes]) -> Set[bytes]:
+        """
+        Generates the trapdoors of many labels.
+
+        :param labels: The plaintext labels.
+        :return: A set of secure tokens that can be used for searching.
+        """
+        return set(HMACBatch(self.hmac_key, labels))
+
+
+def _entry_label(token: bytes, index: int, label_version: int) -> bytes:
+    """
+    Derives the label under which the `index`-th value of a token is stored.
+
+    :param token: The trapdoor of the plaintext label.
+    :param index: The position of the value in the label's list.
+    :param label_version: The label derivation to use.
+    :return: The ciphertext label.
+    """
+    if label_version == LABEL_VERSION_LEGACY:
+        return Hash(token + bytes(index))
+    return Hash(token + index.to_bytes(COUNTER_BYTES, "big"))
+
+
+def _pack_block(blocks: int, ct_values: List[bytes], block_size: int) -> bytes:
+    """
+    Packs up to `block_size` ciphertexts into one block of a posting list.
+
+    :param blocks: The number of blocks of the posting list.
+    :param ct_values: The ciphertexts of the block.
+    :param block_size: The number of slots of a block.
+    :return: The packed block.
+    """
+    slots = [SLOT_HEADER.pack(len(ct_value)) + ct_value for ct_value in ct_values]
+    slots.extend(SLOT_HEADER.pack(0) for _ in range(block_size - len(ct_values)))
+    return BLOCK_HEADER.pack(blocks) + b"".join(slots)
+
+
+def _unpack_block(block: bytes) -> Tuple[int, List[bytes]]:
+    """
+    Unpacks a block of a posting list.
+
+    :param block: The packed block.
+    :return: The number of blocks of the posting list and the ciphertexts of the block.
+    """
+    blocks, = BLOCK_HEADER.unpack_from(block, 0)
+    ct_values = []
+    offset = BLOCK_HEADER.size
+    while offset < len(block):
+        length, = SLOT_HEADER.unpack_from(block, offset)
+        offset += SLOT_HEADER.size
+        if length > 0:
+            ct_values.append(block[offset: offset + length])
+            offset += length
+    return blocks, ct_values
+
+
+def _encrypt_batch(hmac_key: bytes, enc_key: bytes, batch: List[Tuple[bytes, List[bytes]]], label_version: int,
+                   block_size: int, cipher_suite: CipherSuite) -> List[Tuple[bytes, bytes]]:
+    """
+    Encrypts a batch of multi-map entries. Defined at module level so that it can be sent to a process pool.
+
+    :param hmac_key: The key used to derive the label tokens.
+    :param enc_key: The key used to encrypt the values.
+    :param batch: A list of (label, values) pairs.
+    :param label_version: The derivation of the entry labels.
+    :param block_size: The number of ciphertexts packed per entry, or 0 to store one ciphertext per entry.
+    :param cipher_suite: The encryption of the values.
+    :return: A list of (ciphertext label, ciphertext value) pairs.
+    """
+    plaintexts = [value for _, values in batch for value in values]
+    ct_values = cipher_suite.encrypt_batch(enc_key, plaintexts)
+
+    entries = []
+    offset = 0
+    for label, values in batch:
+        token = HMAC(hmac_key, label)
+        label_ct_values = ct_values[offset: offset + len(values)]
+        offset += len(values)
+
+        if block_size == 0:
+            for index, ct_value in enumerate(label_ct_values):
+                entries.append((_entry_label(token, index, label_version), ct_value))
+        else:
+            blocks = (len(label_ct_values) + block_size - 1) // block_size
+            for index in range(blocks):
+                block = _pack_block(blocks, label_ct_values[index * block_size: (index + 1) * block_size], block_size)
+                entries.append((_entry_label(token, index, label_version), block))
+
+    return entries
+
+
+def _build_stats(labels: int, values: int, seconds: float) -> Dict[str, float]:
+    """
+    Summarizes the throughput of an index build.
+
+    :param labels: The number of encrypted labels.
+    :param values: The number of encrypted values.
+    :param seconds: The encryption wall-clock time.
+    :return: A dictionary with the counts, the time and the labels/s and values/s throughput.
+    """
+    return {
+        "labels": labels,
+        "values": values,
+        "seconds": seconds,
+        "labels_per_second": labels / seconds if seconds > 0 else float("inf"),
+        "values_per_second": values / seconds if seconds > 0 else float("inf"),
+    }
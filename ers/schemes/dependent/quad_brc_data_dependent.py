@@ -1,5 +1,5 @@
 from collections import defaultdict
-from typing import Dict, List, Set
+from typing import Dict, List, Set, Type
 
 from tqdm import tqdm
 
@@ -9,43 +9,40 @@ from ers.structures.hyperrange import HyperRange
 from ers.structures.hyperrange_tree import HyperRangeTree
 from ers.structures.point import Point
 from ers.util.hyperrange.data_dependent_split_divider import DataDependentSplitDivider
+from ers.util.profiling.build_profiler import PHASE_TREE_CONSTRUCTION, PHASE_DESCEND_AND_LABEL, COUNT_NODES
 
 
 class QuadBRCDataDependent(EMM):
-    def __init__(self, emm_engine: EMMEngine):
+    def __init__(self, emm_engine: EMMEngine, tree_class: Type[HyperRangeTree] = HyperRangeTree):
         super().__init__(emm_engine)
+        self.tree_class = tree_class
         self.tree = None
         self.encrypted_db = None
 
     def build_index(self, key: bytes, plaintext_mm: Dict[Point, List[bytes]]):
-        self.tree = HyperRangeTree.init(HyperRange.from_bits(self.emm_engine.DIMENSIONS_BITS), DataDependentSplitDivider(2, plaintext_mm))
+        profiler = self.emm_engine.profiler
+
+        with profiler.phase(PHASE_TREE_CONSTRUCTION):
+            self.tree = self.tree_class.init(HyperRange.from_bits(self.emm_engine.DIMENSIONS_BITS), DataDependentSplitDivider(2, plaintext_mm))
 
         modified_db = defaultdict(list)
-        for point, vals in tqdm(plaintext_mm.items()):
-            assert point.dimensions() == self.dimensions
+        with profiler.phase(PHASE_DESCEND_AND_LABEL):
+            for point, vals in tqdm(plaintext_mm.items()):
+                assert point.dimensions() == self.dimensions
 
-            for rng in self.tree.descend(point):
-                label = rng.to_bytes()
-                modified_db[label].extend(vals)
+                ranges = self.tree.descend(point)
+                profiler.count(COUNT_NODES, len(ranges))
+                for rng in ranges:
+                    label = self.emm_engine.label(rng)
+                    modified_db[label].extend(vals)
 
         self.encrypted_db = self.emm_engine.build_index(key, modified_db)
 
     def trapdoor(self, key: bytes, query: HyperRange) -> Set[bytes]:
-        trapdoors = set()
+        labels = []
 
         for rng in self.tree.brc(query):
-            label = rng.to_bytes()
-            trapdoors.add(self.emm_engine.trapdoor(key, label))
-
-        return trapdoors
-
-    def search(self, trapdoors: Set[bytes]) -> Set[bytes]:
-        results = set()
-
-        if self.encrypted_db is None:
-            raise ValueError("Index is not built yet!")
-
-        for trapdoor in trapdoors:
-            results = results.union(self.emm_engine.search(trapdoor, self.encrypted_db))
+            label = self.emm_engine.label(rng)
+            labels.append(label)
 
-        return results
+        return self.emm_engine.trapdoors(key, labels)
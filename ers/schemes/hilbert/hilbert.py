@@ -1,9 +1,10 @@
-from typing import Set, List, Dict
+from typing import Dict, Iterable, Iterator, List
 
 from ers.schemes.common.emm import EMM
 from ers.schemes.common.emm_engine import EMMEngine
 from ers.structures.hilbert_curve import HilbertCurve
 from ers.structures.point import Point
+from ers.util.profiling.build_profiler import PHASE_HILBERT_MAPPING
 
 
 class HilbertScheme(EMM):
@@ -35,21 +36,19 @@ class HilbertScheme(EMM):
         for p in plaintext_mm.keys():
             assert p.dimensions() == self.dimensions
 
-        return {self.hc.distance_from_point(p): plaintext_mm[p] for p in plaintext_mm.keys()}
+        with self.emm_engine.profiler.phase(PHASE_HILBERT_MAPPING):
+            points = list(plaintext_mm.keys())
+            return {d: plaintext_mm[p] for p, d in zip(points, self.hc.distances_from_points(points))}
 
-    def search(self, trapdoors: Set[bytes]) -> Set[bytes]:
+    def search_iter(self, trapdoors: Iterable[bytes]) -> Iterator[bytes]:
         """
-        Searches for encrypted values corresponding to the given trapdoor tokens.
+        Lazily yields the encrypted values corresponding to the given trapdoor tokens.
+        Unlike the other schemes, searching an index that is not built yet yields no results.
 
         :param trapdoors: A set of search tokens.
-        :return: A set of encrypted results from the secure index.
+        :return: An iterator of encrypted results from the secure index.
         """
-        results = set()
-
         if self.encrypted_db is None:
-            return results
-
-        for trapdoor in trapdoors:
-            results = results.union(self.emm_engine.search(trapdoor, self.encrypted_db))
+            return iter(())
 
-        return results
+        return super().search_iter(trapdoors)
@@ -1,5 +1,5 @@
 from collections import defaultdict
-from typing import Dict, List, Set
+from typing import Dict, List, Optional, Set
 
 from tqdm import tqdm
 
@@ -7,6 +7,7 @@ from ers.schemes.common.emm_engine import EMMEngine
 from ers.schemes.hilbert.hilbert import HilbertScheme
 from ers.structures.hyperrange import HyperRange
 from ers.structures.point import Point
+from ers.util.profiling.build_profiler import PHASE_DESCEND_AND_LABEL
 
 
 class LinearHilbert(HilbertScheme):
@@ -14,26 +15,29 @@ class LinearHilbert(HilbertScheme):
         super().__init__(emm_engine)
 
     def build_index(self, key: bytes, plaintext_mm: Dict[Point, List[bytes]]):
+        profiler = self.emm_engine.profiler
+
         hilbert_plaintext_mm = self._hilbert_plaintext_mm(plaintext_mm)
 
         modified_db = defaultdict(list)
-
-        for distance, vals in tqdm(hilbert_plaintext_mm.items()):
-            label = HyperRange.from_point_coords([distance]).to_bytes()
-            modified_db[label].extend(vals)
+        with profiler.phase(PHASE_DESCEND_AND_LABEL):
+            for distance, vals in tqdm(hilbert_plaintext_mm.items()):
+                label = self.emm_engine.label(HyperRange.from_point_coords([distance]))
+                modified_db[label].extend(vals)
 
         self.encrypted_db = self.emm_engine.build_index(key, modified_db)
 
-    def trapdoor(self, key: bytes, query: HyperRange, merging_tolerance: float = 0) -> Set[bytes]:
+    def trapdoor(self, key: bytes, query: HyperRange, merging_tolerance: float = 0,
+                 max_segments: Optional[int] = None) -> Set[bytes]:
         assert query.dimensions == self.dimensions
 
-        ranges = self.hc.brc_with_merging(query, merging_tolerance)
+        ranges = self.hc.brc_with_merging(query, merging_tolerance, max_segments)
 
-        trapdoors = set()
+        labels = []
 
         for (start_distance, end_distance) in ranges:
             for distance in range(start_distance, end_distance + 1):
-                label = HyperRange.from_point_coords([distance]).to_bytes()
-                trapdoors.add(self.emm_engine.trapdoor(key, label))
+                label = self.emm_engine.label(HyperRange.from_point_coords([distance]))
+                labels.append(label)
 
-        return trapdoors
+        return self.emm_engine.trapdoors(key, labels)
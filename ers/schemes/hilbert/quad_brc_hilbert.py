@@ -1,5 +1,5 @@
 from collections import defaultdict
-from typing import Dict, List, Set
+from typing import Dict, List, Optional, Set, Type
 
 from tqdm import tqdm
 
@@ -9,35 +9,44 @@ from ers.structures.hyperrange import HyperRange
 from ers.structures.hyperrange_tree import HyperRangeTree
 from ers.structures.point import Point
 from ers.util.hyperrange.uniform_split_divider import UniformSplitDivider
+from ers.util.profiling.build_profiler import PHASE_TREE_CONSTRUCTION, PHASE_DESCEND_AND_LABEL, COUNT_NODES
 
 
 class QuadBRCHilbert(HilbertScheme):
-    def __init__(self, emm_engine: EMMEngine):
+    def __init__(self, emm_engine: EMMEngine, tree_class: Type[HyperRangeTree] = HyperRangeTree):
         super().__init__(emm_engine)
+        self.tree_class = tree_class
         self.tree = None
 
     def build_index(self, key: bytes, plaintext_mm: Dict[Point, List[bytes]]):
+        profiler = self.emm_engine.profiler
+
         hilbert_plaintext_mm = self._hilbert_plaintext_mm(plaintext_mm)
 
-        tree_height = self.dimensions * self.order
-        self.tree = HyperRangeTree.init(HyperRange.from_bits([tree_height]), UniformSplitDivider(2 ** self.dimensions))
+        with profiler.phase(PHASE_TREE_CONSTRUCTION):
+            tree_height = self.dimensions * self.order
+            self.tree = self.tree_class.init(HyperRange.from_bits([tree_height]), UniformSplitDivider(2 ** self.dimensions))
 
         modified_db = defaultdict(list)
-        for distance, vals in tqdm(hilbert_plaintext_mm.items()):
-            for rng in self.tree.descend(HyperRange.from_point_coords([distance])):
-                label_bytes = rng.to_bytes()
-                modified_db[label_bytes].extend(vals)
+        with profiler.phase(PHASE_DESCEND_AND_LABEL):
+            for distance, vals in tqdm(hilbert_plaintext_mm.items()):
+                ranges = self.tree.descend(HyperRange.from_point_coords([distance]))
+                profiler.count(COUNT_NODES, len(ranges))
+                for rng in ranges:
+                    label_bytes = self.emm_engine.label(rng)
+                    modified_db[label_bytes].extend(vals)
 
         self.encrypted_db = self.emm_engine.build_index(key, modified_db)
 
-    def trapdoor(self, key: bytes, query: HyperRange, merging_tolerance: float = 0) -> Set[bytes]:
-        ranges = self.hc.brc_with_merging(query, merging_tolerance)
+    def trapdoor(self, key: bytes, query: HyperRange, merging_tolerance: float = 0,
+                 max_segments: Optional[int] = None) -> Set[bytes]:
+        ranges = self.hc.brc_with_merging(query, merging_tolerance, max_segments)
 
-        trapdoors = set()
+        labels = []
 
         for (start_distance, end_distance) in ranges:
             for rng in self.tree.brc(HyperRange.from_coords([start_distance], [end_distance])):
-                label_bytes = rng.to_bytes()
-                trapdoors.add(self.emm_engine.trapdoor(key, label_bytes))
+                label_bytes = self.emm_engine.label(rng)
+                labels.append(label_bytes)
 
-        return trapdoors
\ No newline at end of file
+        return self.emm_engine.trapdoors(key, labels)
\ No newline at end of file
@@ -1,5 +1,5 @@
 from collections import defaultdict
-from typing import Dict, List, Set
+from typing import Dict, List, Set, Type
 
 from tqdm import tqdm
 
@@ -9,35 +9,41 @@ from ers.structures.hyperrange import HyperRange
 from ers.structures.hyperrange_tree import HyperRangeTree
 from ers.structures.point import Point
 from ers.util.hyperrange.uniform_split_mid_overlap_divider import UniformSplitMidOverlapDivider
+from ers.util.profiling.build_profiler import PHASE_TREE_CONSTRUCTION, PHASE_DESCEND_AND_LABEL, COUNT_NODES
 
 
 class TdagSRCHilbert(HilbertScheme):
-    def __init__(self, emm_engine: EMMEngine):
+    def __init__(self, emm_engine: EMMEngine, tree_class: Type[HyperRangeTree] = HyperRangeTree):
         super().__init__(emm_engine)
+        self.tree_class = tree_class
         self.tdag = None
 
     def build_index(self, key: bytes, plaintext_mm: Dict[Point, List[bytes]]):
+        profiler = self.emm_engine.profiler
+
         hilbert_plaintext_mm = self._hilbert_plaintext_mm(plaintext_mm)
 
-        tdag_height = self.dimensions * self.order
-        self.tdag = HyperRangeTree.init(HyperRange.from_bits([tdag_height]), UniformSplitMidOverlapDivider(2))
+        with profiler.phase(PHASE_TREE_CONSTRUCTION):
+            tdag_height = self.dimensions * self.order
+            self.tdag = self.tree_class.init(HyperRange.from_bits([tdag_height]), UniformSplitMidOverlapDivider(2))
 
         modified_db = defaultdict(list)
-        for distance, vals in tqdm(hilbert_plaintext_mm.items()):
-            for rng in self.tdag.descend(HyperRange.from_point_coords([distance])):
-                label_bytes = rng.to_bytes()
-                modified_db[label_bytes].extend(vals)
+        with profiler.phase(PHASE_DESCEND_AND_LABEL):
+            for distance, vals in tqdm(hilbert_plaintext_mm.items()):
+                ranges = self.tdag.descend(HyperRange.from_point_coords([distance]))
+                profiler.count(COUNT_NODES, len(ranges))
+                for rng in ranges:
+                    label_bytes = self.emm_engine.label(rng)
+                    modified_db[label_bytes].extend(vals)
 
         self.encrypted_db = self.emm_engine.build_index(key, modified_db)
 
     def trapdoor(self, key: bytes, query: HyperRange) -> Set[bytes]:
-        trapdoors = set()
         hilbert_range = self.hc.src(query)
 
         rng = self.tdag.src(HyperRange.from_coords([hilbert_range[0]], [hilbert_range[1]]))
         assert rng is not None
 
-        label_bytes = rng.to_bytes()
-        trapdoors.add(self.emm_engine.trapdoor(key, label_bytes))
+        label_bytes = self.emm_engine.label(rng)
 
-        return trapdoors
\ No newline at end of file
+        return self.emm_engine.trapdoors(key, [label_bytes])
\ No newline at end of file
@@ -7,6 +7,7 @@ from ers.schemes.common.emm import EMM
 from ers.schemes.common.emm_engine import EMMEngine
 from ers.structures.hyperrange import HyperRange
 from ers.structures.point import Point
+from ers.util.profiling.build_profiler import PHASE_DESCEND_AND_LABEL
 
 
 class Linear(EMM):
@@ -15,33 +16,24 @@ class Linear(EMM):
         self.encrypted_db = None
 
     def build_index(self, key: bytes, plaintext_mm: Dict[Point, List[bytes]]):
-        modified_db = defaultdict(list)
+        profiler = self.emm_engine.profiler
 
-        for point, vals in tqdm(plaintext_mm.items()):
-            assert point.dimensions() == self.dimensions
-            label = HyperRange.from_point(point).to_bytes()
-            modified_db[label].extend(vals)
+        modified_db = defaultdict(list)
+        with profiler.phase(PHASE_DESCEND_AND_LABEL):
+            for point, vals in tqdm(plaintext_mm.items()):
+                assert point.dimensions() == self.dimensions
+                label = self.emm_engine.label(HyperRange.from_point(point))
+                modified_db[label].extend(vals)
 
         self.encrypted_db = self.emm_engine.build_index(key, modified_db)
 
     def trapdoor(self, key: bytes, query: HyperRange) -> Set[bytes]:
         assert query.dimensions == self.dimensions
 
-        trapdoors = set()
+        labels = []
 
         for point in query.points():
-            label = HyperRange.from_point(point).to_bytes()
-            trapdoors.add(self.emm_engine.trapdoor(key, label))
-
-        return trapdoors
-
-    def search(self, trapdoors: Set[bytes]) -> Set[bytes]:
-        results = set()
-
-        if self.encrypted_db is None:
-            raise ValueError("Index is not built yet!")
-
-        for trapdoor in trapdoors:
-            results = results.union(self.emm_engine.search(trapdoor, self.encrypted_db))
+            label = self.emm_engine.label(HyperRange.from_point(point))
+            labels.append(label)
 
-        return results
+        return self.emm_engine.trapdoors(key, labels)
@@ -5,10 +5,11 @@ from tqdm import tqdm
 
 from .common.emm import EMM
 from .common.emm_engine import EMMEngine
+from ..structures.dyadic_hyperrange_tree import DyadicHyperRangeTree
 from ..structures.hyperrange import HyperRange
-from ..structures.hyperrange_tree import HyperRangeTree
 from ..structures.point import Point
 from ..util.hyperrange.uniform_split_divider import UniformSplitDivider
+from ..util.profiling.build_profiler import PHASE_TREE_CONSTRUCTION, PHASE_DESCEND_AND_LABEL, COUNT_NODES
 
 
 class QuadBRC(EMM):
@@ -18,34 +19,29 @@ class QuadBRC(EMM):
         self.encrypted_db = None
 
     def build_index(self, key: bytes, plaintext_mm: Dict[Point, List[bytes]]):
-        self.tree = HyperRangeTree.init(HyperRange.from_bits(self.emm_engine.DIMENSIONS_BITS), UniformSplitDivider(2))
+        profiler = self.emm_engine.profiler
+
+        with profiler.phase(PHASE_TREE_CONSTRUCTION):
+            self.tree = DyadicHyperRangeTree.init(HyperRange.from_bits(self.emm_engine.DIMENSIONS_BITS), UniformSplitDivider(2))
 
         modified_db = defaultdict(list)
-        for point, vals in tqdm(plaintext_mm.items()):
-            assert point.dimensions() == self.dimensions
+        with profiler.phase(PHASE_DESCEND_AND_LABEL):
+            for point, vals in tqdm(plaintext_mm.items()):
+                assert point.dimensions() == self.dimensions
 
-            for rng in self.tree.descend(point):
-                label = rng.to_bytes()
-                modified_db[label].extend(vals)
+                ranges = self.tree.descend(point)
+                profiler.count(COUNT_NODES, len(ranges))
+                for rng in ranges:
+                    label = self.emm_engine.label(rng)
+                    modified_db[label].extend(vals)
 
         self.encrypted_db = self.emm_engine.build_index(key, modified_db)
 
     def trapdoor(self, key: bytes, query: HyperRange) -> Set[bytes]:
-        trapdoors = set()
+        labels = []
 
         for rng in self.tree.brc(query):
-            label = rng.to_bytes()
-            trapdoors.add(self.emm_engine.trapdoor(key, label))
-
-        return trapdoors
-
-    def search(self, trapdoors: Set[bytes]) -> Set[bytes]:
-        results = set()
-
-        if self.encrypted_db is None:
-            raise ValueError("Index is not built yet!")
-
-        for trapdoor in trapdoors:
-            results = results.union(self.emm_engine.search(trapdoor, self.encrypted_db))
+            label = self.emm_engine.label(rng)
+            labels.append(label)
 
-        return results
+        return self.emm_engine.trapdoors(key, labels)
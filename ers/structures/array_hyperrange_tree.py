@@ -0,0 +1,266 @@
+import sys
+from array import array
+from typing import List, Optional, Tuple, Union
+
+from ers.structures.hyperrange import HyperRange
+from ers.structures.hyperrange_tree import HyperRangeTree
+from ers.structures.point import Point
+from ers.util.hyperrange.divider import HyperRangeDivider
+
+# Coordinates are stored as signed 64-bit integers when the root range allows it, and as Python integers otherwise.
+INT64_BOUND = 2 ** 63
+
+
+class ArrayHyperRangeTreeBuffers:
+    """
+    Holds the nodes of a tree as flat buffers, in breadth-first order.
+
+    The bounds of node i are `starts[i * dimensions: (i + 1) * dimensions]` and `ends[...]`, and its children are
+    the nodes `child_offsets[i]` to `child_offsets[i + 1] - 1` (CSR-style, as the children of a node are contiguous).
+    """
+
+    def __init__(self, dimensions: int, compact: bool):
+        """
+        Initializes empty buffers.
+
+        :param dimensions: The number of dimensions of the ranges.
+        :param compact: Whether the coordinates fit in signed 64-bit integers.
+        """
+        self.dimensions = dimensions
+        self.starts = array("q") if compact else []
+        self.ends = array("q") if compact else []
+        self.heights = array("i")
+        self.child_offsets = array("q")
+
+    def __len__(self):
+        return len(self.heights)
+
+    def nbytes(self) -> int:
+        """
+        Computes the memory used by the buffers.
+
+        :return: The size of the buffers in bytes.
+        """
+        size = 0
+        for buffer in [self.starts, self.ends, self.heights, self.child_offsets]:
+            if isinstance(buffer, array):
+                size += sys.getsizeof(buffer)
+            else:
+                size += sys.getsizeof(buffer) + sum(sys.getsizeof(c) for c in buffer)
+        return size
+
+
+class ArrayHyperRangeTree(HyperRangeTree):
+    """
+    Represents a materialized HyperRangeTree whose nodes are stored in flat buffers instead of Python objects.
+
+    An instance is a thin facade over one node of the buffers, so the existing callers of `descend`, `rc`, `src`,
+    `brc` and `urc` work unchanged. The ranges of the nodes are only created when they are returned.
+    """
+
+    def __init__(self, buffers: ArrayHyperRangeTreeBuffers, index: int, division_strategy: HyperRangeDivider):
+        """
+        Initializes an ArrayHyperRangeTree node.
+
+        :param buffers: The buffers holding the nodes of the tree.
+        :param index: The index of this node in the buffers.
+        :param division_strategy: The strategy used to divide the HyperRange.
+        """
+        self.buffers = buffers
+        self.index = index
+        self.division_strategy = division_strategy
+        self.dimensions = buffers.dimensions
+
+    @classmethod
+    def init(cls, rng: HyperRange, division_strategy: HyperRangeDivider) -> "ArrayHyperRangeTree":
+        """
+        Constructs an ArrayHyperRangeTree using a division strategy, dividing the nodes in breadth-first order.
+
+        :param rng: The root HyperRange.
+        :param division_strategy: The strategy to divide the HyperRange.
+        :return: The root ArrayHyperRangeTree node.
+        """
+        dimensions = rng.dimensions
+        compact = all(-INT64_BOUND <= rng.start[i] and rng.end[i] < INT64_BOUND for i in range(dimensions))
+        buffers = ArrayHyperRangeTreeBuffers(dimensions, compact)
+        buffers.starts.extend(rng.start.coords())
+        buffers.ends.extend(rng.end.coords())
+
+        count = 1
+        index = 0
+        with division_strategy.building():
+            while index < count:
+                base = index * dimensions
+                node_rng = HyperRange.from_coords(list(buffers.starts[base: base + dimensions]), list(buffers.ends[base: base + dimensions]))
+                children = division_strategy.divide(node_rng)
+                buffers.child_offsets.append(count)
+                for c in children:
+                    buffers.starts.extend(c.start.coords())
+                    buffers.ends.extend(c.end.coords())
+                count += len(children)
+                index += 1
+        buffers.child_offsets.append(count)
+
+        buffers.heights = array("i", [0]) * count
+        for index in reversed(range(count)):
+            first, last = buffers.child_offsets[index], buffers.child_offsets[index + 1]
+            if first < last:
+                buffers.heights[index] = max(buffers.heights[first:last]) + 1
+
+        return cls(buffers, 0, division_strategy)
+
+    @property
+    def rng(self) -> HyperRange:
+        """
+        :return: The HyperRange represented by this node.
+        """
+        return self.__rng(self.index)
+
+    @property
+    def height(self) -> int:
+        """
+        :return: The height of the tree from this node.
+        """
+        return self.buffers.heights[self.index]
+
+    @property
+    def children(self) -> List["ArrayHyperRangeTree"]:
+        """
+        :return: List of child ArrayHyperRangeTree nodes.
+        """
+        return [ArrayHyperRangeTree(self.buffers, c, self.division_strategy) for c in self.__children(self.index)]
+
+    def descend(self, rng: Union[HyperRange, Point]) -> List[HyperRange]:
+        """
+        Recursively retrieves all ranges that contain the given range.
+
+        :param rng: The HyperRange (or Point) to search within.
+        :return: A list of contained HyperRanges.
+        """
+        rng_start, rng_end = self.__bounds(rng)
+        result = []
+
+        def helper(index: int):
+            if self.__contains(index, rng_start, rng_end):
+                result.append(self.__rng(index))
+                for c in self.__children(index):
+                    helper(c)
+
+        helper(self.index)
+        return result
+
+    def rc(self, rng: HyperRange) -> List[Tuple[int, HyperRange]]:
+        """
+        Retrieves all ranges contained within the given range, along with their heights.
+
+        :param rng: The HyperRange to search within.
+        :return: A list of tuples containing height and corresponding HyperRange.
+        """
+        rng_start, rng_end = self.__bounds(rng)
+        starts, ends = self.buffers.starts, self.buffers.ends
+        dimensions = range(self.dimensions)
+        result = []
+
+        def helper(index: int):
+            base = index * self.dimensions
+            contained = True
+            for i in dimensions:
+                if ends[base + i] < rng_start[i] or rng_end[i] < starts[base + i]:
+                    return
+                if starts[base + i] < rng_start[i] or rng_end[i] < ends[base + i]:
+                    contained = False
+
+            if contained:
+                result.append((self.buffers.heights[index], self.__rng(index)))
+            else:
+                for c in self.__children(index):
+                    helper(c)
+
+        helper(self.index)
+        return result
+
+    def src(self, rng: HyperRange) -> Optional[HyperRange]:
+        """
+        Finds the single range covering the given range.
+
+        :param rng: The HyperRange to cover.
+        :return: The single HyperRange covering the given range.
+        """
+        rng_start, rng_end = self.__bounds(rng)
+
+        def helper(index: int) -> Optional[HyperRange]:
+            if not self.__contains(index, rng_start, rng_end):
+                return None
+
+            results = []
+            for c in self.__children(index):
+                result = helper(c)
+                if result is not None:
+                    results.append(result)
+
+            if results:
+                return min(results, key=lambda r: r.volume())
+            else:
+                return self.__rng(index)
+
+        return helper(self.index)
+
+    def nbytes(self) -> int:
+        """
+        Computes the memory used by the nodes of the whole tree.
+
+        :return: The size of the tree in bytes.
+        """
+        return self.buffers.nbytes()
+
+    def __len__(self):
+        """
+        :return: The number of nodes of the whole tree.
+        """
+        return len(self.buffers)
+
+    @staticmethod
+    def __bounds(rng: Union[HyperRange, Point]) -> Tuple[List[int], List[int]]:
+        """
+        Extracts the coordinates of the bounds of a range or a point.
+
+        :param rng: A HyperRange or a Point.
+        :return: The start and end coordinates.
+        """
+        if isinstance(rng, Point):
+            return rng.coords(), rng.coords()
+        return rng.start.coords(), rng.end.coords()
+
+    def __rng(self, index: int) -> HyperRange:
+        """
+        Creates the HyperRange of a node.
+
+        :param index: The index of the node.
+        :return: The HyperRange of the node.
+        """
+        base = index * self.dimensions
+        return HyperRange(Point(list(self.buffers.starts[base: base + self.dimensions])),
+                          Point(list(self.buffers.ends[base: base + self.dimensions])))
+
+    def __children(self, index: int) -> range:
+        """
+        :param index: The index of a node.
+        :return: The indices of the children of the node.
+        """
+        return range(self.buffers.child_offsets[index], self.buffers.child_offsets[index + 1])
+
+    def __contains(self, index: int, rng_start: List[int], rng_end: List[int]) -> bool:
+        """
+        Checks whether a node contains the range given by its bounds.
+
+        :param index: The index of the node.
+        :param rng_start: The start coordinates of the range.
+        :param rng_end: The end coordinates of the range.
+        :return: True if the range is within the node, False otherwise.
+        """
+        base = index * self.dimensions
+        starts, ends = self.buffers.starts, self.buffers.ends
+        for i in range(self.dimensions):
+            if rng_start[i] < starts[base + i] or ends[base + i] < rng_end[i]:
+                return False
+        return True
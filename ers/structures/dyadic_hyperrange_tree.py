@@ -0,0 +1,152 @@
+from itertools import product
+from operator import and_, le, or_
+from typing import Dict, List, Optional, Tuple, Union
+
+from ers.structures.hyperrange import HyperRange
+from ers.structures.lazy_hyperrange_tree import LazyHyperRangeTree
+from ers.structures.point import Point
+from ers.util.hyperrange.divider import HyperRangeDivider
+from ers.util.hyperrange.uniform_split_divider import UniformSplitDivider
+
+
+class DyadicHyperRangeTree(LazyHyperRangeTree):
+    """
+    Represents the implicit tree built by halving every dimension of a dyadic HyperRange, i.e. a range whose sides
+    are powers of two and whose start is aligned to its sides (such as the domains built by `HyperRange.from_bits`).
+
+    The node at depth k has the sides 2^max(bits - k, 0), so its coordinates follow from the bits of the queried
+    coordinates: `descend` is the ancestor chain, `src` is the longest common prefix of the range bounds and `rc`
+    is the canonical dyadic decomposition. The covers are identical to those of a HyperRangeTree built with
+    `UniformSplitDivider(2)`, in the same order.
+    """
+
+    def __init__(self, rng: HyperRange, division_strategy: HyperRangeDivider,
+                 heights: Optional[Dict[Tuple[int, ...], int]] = None):
+        """
+        Initializes a DyadicHyperRangeTree node.
+
+        :param rng: The dyadic HyperRange represented by this node.
+        :param division_strategy: A `UniformSplitDivider(2)` instance.
+        :param heights: The heights of the already seen range shapes, shared by all the nodes of a tree.
+        :raises ValueError: If the range is not dyadic or the division strategy does not halve every dimension.
+        """
+        if not isinstance(division_strategy, UniformSplitDivider) or division_strategy.num_splits != 2:
+            raise ValueError("A dyadic tree requires a UniformSplitDivider(2) division strategy")
+
+        self.bits = []
+        for i in range(rng.dimensions):
+            length = rng.end[i] - rng.start[i] + 1
+            if length & (length - 1) != 0 or rng.start[i] % length != 0:
+                raise ValueError("The range is not dyadic")
+            self.bits.append(length.bit_length() - 1)
+
+        super().__init__(rng, division_strategy, heights)
+        # The side of the nodes at every depth minus one, as a bit mask: a node contains the coordinates c
+        # such that c & ~mask is its start and c | mask its end.
+        self.__masks = [tuple((1 << max(b - depth, 0)) - 1 for b in self.bits) for depth in range(self.height + 1)]
+        self.__inverse_masks = [tuple(~m for m in mask) for mask in self.__masks]
+
+    def descend(self, rng: Union[HyperRange, Point]) -> List[HyperRange]:
+        """
+        Retrieves all ranges that contain the given range, from the root to the deepest one.
+
+        :param rng: The HyperRange (or Point) to search within.
+        :return: A list of contained HyperRanges.
+        """
+        if rng not in self.rng:
+            return []
+
+        if isinstance(rng, Point):
+            start = end = rng.as_tuple()
+        else:
+            start, end = rng.start.as_tuple(), rng.end.as_tuple()
+
+        depth = self.__depth(start, end)
+        if self.dimensions == 1:
+            # The trees of RangeBRC and of the Hilbert schemes are one-dimensional.
+            c = start[0]
+            return [HyperRange.from_valid_coords((c & ~m,), (c | m,)) for (m,) in self.__masks[:depth + 1]]
+        return [HyperRange.from_valid_coords(tuple(map(and_, start, inverse)), tuple(map(or_, start, mask)))
+                for mask, inverse in zip(self.__masks[:depth + 1], self.__inverse_masks)]
+
+    def src(self, rng: HyperRange) -> Optional[HyperRange]:
+        """
+        Finds the single range covering the given range, which is the deepest node on the ancestor chain.
+
+        :param rng: The HyperRange to cover.
+        :return: The single HyperRange covering the given range.
+        """
+        if rng not in self.rng:
+            return None
+
+        start, end = rng.start.as_tuple(), rng.end.as_tuple()
+        depth = self.__depth(start, end)
+        return HyperRange.from_valid_coords(tuple(map(and_, start, self.__inverse_masks[depth])),
+                                            tuple(map(or_, start, self.__masks[depth])))
+
+    def rc(self, rng: HyperRange) -> List[Tuple[int, HyperRange]]:
+        """
+        Retrieves all ranges contained within the given range, along with their heights, without creating the
+        ranges of the nodes that are only traversed. Only the children intersecting the range are visited.
+
+        :param rng: The HyperRange to search within.
+        :return: A list of tuples containing height and corresponding HyperRange.
+        """
+        if not self.rng.intersects(rng):
+            return []
+
+        rng_start = rng.start.as_tuple()
+        rng_end = rng.end.as_tuple()
+        masks = self.__masks
+        height = self.height
+        result = []
+
+        if self.dimensions == 1:
+            # From left to right, the largest aligned block that starts at x and ends within the range,
+            # which is the order of the depth-first walk.
+            root_size = masks[0][0] + 1
+            x = max(rng_start[0], self.rng.start[0])
+            end = min(rng_end[0], self.rng.end[0])
+            while x <= end:
+                size = min(x & -x or root_size, root_size)
+                while x + size - 1 > end:
+                    size >>= 1
+                result.append((size.bit_length() - 1, HyperRange.from_valid_coords((x,), (x + size - 1,))))
+                x += size
+            return result
+
+        def helper(depth: int, node_start: Tuple[int, ...]):
+            node_end = tuple(map(or_, node_start, masks[depth]))
+            if all(map(le, rng_start, node_start)) and all(map(le, node_end, rng_end)):
+                result.append((height - depth, HyperRange.from_valid_coords(node_start, node_end)))
+                return
+
+            halves = []
+            for s, e, cm, lo, hi in zip(node_start, node_end, masks[depth + 1], rng_start, rng_end):
+                if s | cm == e:
+                    halves.append((s,))
+                else:
+                    # The node intersects the range, so at least one of its halves does.
+                    middle = e - cm
+                    halves.append((s, middle) if lo < middle <= hi else (s,) if hi < middle else (middle,))
+            for child_start in product(*halves):
+                helper(depth + 1, child_start)
+
+        helper(0, self.rng.start.as_tuple())
+        return result
+
+    def __depth(self, start: Tuple[int, ...], end: Tuple[int, ...]) -> int:
+        """
+        Computes the depth of the deepest node containing the given range, from the longest common prefix
+        of the bounds of the range in each dimension.
+
+        :param start: The start coordinates of a range within the root range.
+        :param end: The end coordinates of the range.
+        :return: The depth of the deepest node containing the range.
+        """
+        depth = self.height
+        for b, s, e in zip(self.bits, start, end):
+            prefix_bits = (s ^ e).bit_length()
+            if prefix_bits > 0:
+                depth = min(depth, b - prefix_bits)
+        return depth
@@ -1,10 +1,22 @@
-from typing import List, Tuple, Iterable
+import heapq
+from typing import List, Optional, Tuple, Iterable
 
+import numpy as np
 from hilbertcurve.hilbertcurve import HilbertCurve as Hc
 
 from ers.structures.hyperrange import HyperRange
 from ers.structures.point import Point
 
+# Bulk conversions run the Skilling transform over arrays of uint64 coordinates, so they support orders up to
+# 64 bits per dimension; distances wider than 64 bits are assembled from several uint64 words.
+MAX_VECTORIZED_ORDER = 64
+# Below this many points, the fixed cost of the array operations exceeds the scalar conversions.
+MIN_VECTORIZED_BATCH = 48
+WORD_BITS = 64
+# Above this many dimensions, the curve has too many states to learn (192 in 4D, thousands in 5D), so the covers
+# locate the blocks by decoding their prefixes instead.
+MAX_STATE_DIMENSIONS = 3
+
 
 class HilbertCurve:
     def __init__(self, order: int, dimensions: int):
@@ -17,6 +29,8 @@ class HilbertCurve:
         self.hc = Hc(order, dimensions)
         self.order = order  # edge bits
         self.dimensions = dimensions
+        self.__tables = None
+        self.__prefix_curves = {}
 
     def distance_from_point(self, point: Point) -> int:
         """
@@ -38,21 +52,25 @@ class HilbertCurve:
 
     def distances_from_points(self, points: Iterable[Point]) -> Iterable[int]:
         """
-        Computes the Hilbert distances for a collection of points.
+        Computes the Hilbert distances for a collection of points, vectorized over all the points.
 
         :param points: An iterable of Point objects.
         :return: A list of Hilbert distances corresponding to the given points.
         """
-        return [self.distance_from_point(point) for point in points]
+        return self.__distances_from_coords([point.as_tuple() for point in points])
 
     def points_from_distances(self, distances: Iterable[int]) -> Iterable[Point]:
         """
-        Computes the points corresponding to a collection of Hilbert distances.
+        Computes the points corresponding to a collection of Hilbert distances, vectorized over all the distances.
 
         :param distances: An iterable of Hilbert distances.
         :return: A list of Point objects corresponding to the given distances.
         """
-        return [self.point_from_distance(distance) for distance in distances]
+        distances = list(distances)
+        if len(distances) < MIN_VECTORIZED_BATCH or self.order > MAX_VECTORIZED_ORDER:
+            return [self.point_from_distance(distance) for distance in distances]
+
+        return [Point(c) for c in self.__coords_from_distances(distances).tolist()]
 
     def brc(self, rng: HyperRange):
         """
@@ -63,58 +81,412 @@ class HilbertCurve:
         """
         return self.brc_with_merging(rng, 0)
 
-    def brc_with_merging(self, rng: HyperRange, segment_gap_tolerance: float) -> List[Tuple[int, int]]:
+    def brc_with_merging(self, rng: HyperRange, segment_gap_tolerance: float,
+                         max_segments: Optional[int] = None) -> List[Tuple[int, int]]:
         """
         Computes the best range cover (BRC) while allowing for merging of segments based on a gap tolerance.
+        Two consecutive segments are merged when the gap between them is smaller than the volume of the range
+        times the tolerance.
 
         https://sequentialread.com/building-a-spatial-index-supporting-range-query-using-space-filling-hilbert-curve/
 
         :param rng: A HyperRange object defining the region.
         :param segment_gap_tolerance: The allowed gap fraction for merging segments.
+        :param max_segments: If given, the smallest remaining gaps are merged until at most this many segments are left.
         :return: A list of tuples where each tuple represents a contiguous range of Hilbert distances.
+        :raises ValueError: If max_segments is not positive.
         """
-        perimeter_points = rng.boundary_points()
-        perimeter_distances = sorted(self.distances_from_points(perimeter_points))
-
         segment_gap_threshold = rng.volume() * segment_gap_tolerance
 
         ranges = []
-        i = 0
-        while i < len(perimeter_distances):
-            start_range = perimeter_distances[i]
-            end_range = start_range
+        for start, end in self.__segments(rng):
+            if ranges and start - ranges[-1][1] < segment_gap_threshold:
+                ranges[-1] = (ranges[-1][0], end)
+            else:
+                ranges.append((start, end))
+
+        if max_segments is not None:
+            ranges = self.merge_smallest_gaps(ranges, max_segments)
+
+        return ranges
 
-            while i + 1 < len(perimeter_distances):  # Start a new range
-                if perimeter_distances[i + 1] == perimeter_distances[i] + 1:  # Check if the next index is contiguous
-                    end_range = perimeter_distances[i + 1]
-                    i += 1
-                    continue
+    @staticmethod
+    def merge_smallest_gaps(ranges: List[Tuple[int, int]], max_segments: int) -> List[Tuple[int, int]]:
+        """
+        Merges the smallest gaps between consecutive segments until at most max_segments segments are left.
+        Closing a gap does not change the others, so closing the smallest ones adds the least false-positive volume.
 
-                next_point = self.point_from_distance(perimeter_distances[i] + 1)  # Calculate the point at the next distance
+        :param ranges: A sorted list of disjoint segments of Hilbert distances.
+        :param max_segments: The maximum number of segments to keep.
+        :return: The merged list of segments.
+        :raises ValueError: If max_segments is not positive.
+        """
+        if max_segments < 1:
+            raise ValueError("The number of segments must be positive")
+        if len(ranges) <= max_segments:
+            return ranges
 
-                if not rng.contains_point(next_point):  # If it's outside the rectangle, check tolerance
-                    if perimeter_distances[i + 1] - perimeter_distances[i] >= segment_gap_threshold:
-                        break  # Finalize the current range
-                    else:
-                        end_range = perimeter_distances[i + 1]  # Include the point despite being outside
-                else:
-                    end_range = perimeter_distances[i + 1]  # Point is inside, extend the range
+        gaps = ((ranges[i + 1][0] - ranges[i][1], i) for i in range(len(ranges) - 1))
+        closed = {i for _, i in heapq.nsmallest(len(ranges) - max_segments, gaps)}
 
-                i += 1
+        merged = [ranges[0]]
+        for i in range(1, len(ranges)):
+            if i - 1 in closed:
+                merged[-1] = (merged[-1][0], ranges[i][1])
+            else:
+                merged.append(ranges[i])
+        return merged
 
-            ranges.append((start_range, end_range))  # Finalize and store the current range
-            i += 1
+    @staticmethod
+    def false_positive_volume(rng: HyperRange, ranges: List[Tuple[int, int]]) -> int:
+        """
+        Computes the number of cells outside a range that are covered by its (merged) cover.
 
-        return ranges
+        :param rng: A HyperRange object defining the region.
+        :param ranges: A cover of the range, as returned by `brc_with_merging`.
+        :return: The number of covered cells outside the range.
+        """
+        return sum(end - start + 1 for start, end in ranges) - rng.volume()
 
     def src(self, rng: HyperRange) -> Tuple[int, int]:
         """
         Computes the single range covering (SRC) for a given hyperrange.
 
+        The extreme distances are found by branch and bound: starting from the whole curve, the block holding the
+        minimum (maximum) is replaced at every level by its first (last) sub-block whose cube intersects the range.
+        This takes O(order * 2^dimensions) steps, whatever the size of the range, so the boundary of the range
+        is encoded instead when it holds at most order * 2^dimensions points. The cubes of the sub-blocks follow
+        from the state of their parent, or are decoded from their prefixes in high dimensions.
+
         :param rng: A HyperRange object defining the region.
         :return: A tuple representing the minimum and maximum Hilbert distances covering the hyperrange.
         """
-        perimeter_points = rng.boundary_points()
-        perimeter_distances = sorted(self.distances_from_points(perimeter_points))
+        if rng.boundary_size() <= self.order << self.dimensions:
+            # The extreme distances lie on the boundary of the range, which is cheaper to encode when it is this small.
+            distances = self.__distances_from_coords(list(rng.boundary_coords()))
+            return min(distances), max(distances)
+
+        rng_start = rng.start.as_tuple()
+        rng_end = rng.end.as_tuple()
+        dimensions = range(self.dimensions)
+
+        if self.dimensions > MAX_STATE_DIMENSIONS:
+            def child_lows_at(prefix: int, state: int, lows: List[int], level: int, c: int) -> Tuple[List[int], int]:
+                coords = self.__block_coords([(prefix << self.dimensions) | c], level)[0].tolist()
+                return [coord << level for coord in coords], 0
+        else:
+            orthants, transitions = (table.tolist() for table in self.__state_tables())
+
+            def child_lows_at(prefix: int, state: int, lows: List[int], level: int, c: int) -> Tuple[List[int], int]:
+                return [lows[i] + (orthants[state][c][i] << level) for i in dimensions], transitions[state][c]
+
+        def extreme(children: range) -> int:
+            prefix, state, lows = 0, 0, [0] * self.dimensions
+            for level in range(self.order - 1, -1, -1):
+                side = 1 << level
+                for c in children:
+                    child_lows, child_state = child_lows_at(prefix, state, lows, level, c)
+                    if all(child_lows[i] <= rng_end[i] and rng_start[i] < child_lows[i] + side for i in dimensions):
+                        break
+                prefix = (prefix << self.dimensions) | c
+                state = child_state
+                lows = child_lows
+            return prefix
+
+        children = 1 << self.dimensions
+        return extreme(range(children)), extreme(range(children - 1, -1, -1))
+
+    def __distances_from_coords(self, coords: List[Tuple[int, ...]]) -> List[int]:
+        """
+        Computes the Hilbert distances for a list of coordinate tuples, vectorized for large enough batches.
+
+        :param coords: A list of coordinate tuples.
+        :return: A list of Hilbert distances corresponding to the given coordinates.
+        """
+        if len(coords) < MIN_VECTORIZED_BATCH or self.order > MAX_VECTORIZED_ORDER:
+            return [self.hc.distance_from_point(list(c)) for c in coords]
+
+        coords = np.array(coords, dtype=np.uint64).reshape(len(coords), self.dimensions)
+        return _words_to_integers(_transpose_to_words(_coords_to_transpose(coords, self.order), self.order))
+
+    def __coords_from_distances(self, distances: List[int]) -> np.ndarray:
+        """
+        Computes the coordinates of the points at the given Hilbert distances, reversing `__distances_from_coords`.
+
+        :param distances: A list of at least MIN_VECTORIZED_BATCH Hilbert distances, for an order of at most
+                          MAX_VECTORIZED_ORDER.
+        :return: An array of shape (points, dimensions) of uint64 coordinates.
+        """
+        words = _integers_to_words(distances, self.order * self.dimensions)
+        return _transpose_to_coords(_words_to_transpose(words, self.order, self.dimensions), self.order)
+
+    def __segments(self, rng: HyperRange) -> List[Tuple[int, int]]:
+        """
+        Computes the maximal contiguous Hilbert segments of the cells within a range.
+
+        The blocks of 2^(dimensions * level) consecutive distances starting at a multiple of their size fill the
+        aligned cubes of side 2^level, so the curve is descended level by level: the blocks whose cube lies within
+        the range are emitted, the ones whose cube intersects the range are divided into their 2^dimensions
+        sub-blocks and the others are dropped. Only the blocks crossing the boundary of the range are divided,
+        and the cubes of the sub-blocks follow from the state of their parent, or from their prefixes in high
+        dimensions.
+
+        :param rng: A HyperRange object defining the region.
+        :return: The sorted list of segments, as tuples of the first and last distance.
+        """
+        tables = self.dimensions <= MAX_STATE_DIMENSIONS
+        orthants, transitions = self.__state_tables() if tables else (None, None)
+        prefix_dtype = np.uint64 if self.order * self.dimensions <= WORD_BITS else object
+        coord_dtype = np.uint64 if self.order <= MAX_VECTORIZED_ORDER else object
+        children = np.arange(1 << self.dimensions).astype(prefix_dtype)
+        if tables:
+            orthants = orthants.astype(coord_dtype)
+        rng_start = np.array(rng.start.as_tuple(), dtype=coord_dtype)
+        rng_end = np.array(rng.end.as_tuple(), dtype=coord_dtype)
+
+        segments = []
+        prefixes = np.zeros(1, dtype=prefix_dtype)
+        states = np.zeros(1, dtype=np.intp)
+        lows = np.zeros((1, self.dimensions), dtype=coord_dtype)
+        for level in range(self.order - 1, -1, -1):
+            side = np.array(1 << level, dtype=coord_dtype)
+            prefixes = (prefixes[:, None] * np.array(len(children), dtype=prefix_dtype) + children[None, :]).ravel()
+            if tables:
+                lows = (lows[:, None, :] + orthants[states] * side).reshape(-1, self.dimensions)
+                states = transitions[states].ravel()
+            else:
+                lows = self.__block_coords(prefixes.tolist(), level).astype(coord_dtype) * side
+            highs = lows + (side - np.array(1, dtype=coord_dtype))
+
+            contained = np.all((rng_start <= lows) & (highs <= rng_end), axis=1)
+            crossing = np.all((lows <= rng_end) & (rng_start <= highs), axis=1) & ~contained
+
+            block = 1 << (self.dimensions * level)
+            segments.extend((prefix * block, (prefix + 1) * block - 1) for prefix in prefixes[contained].tolist())
+            if not crossing.any():
+                break
+            prefixes, lows = prefixes[crossing], lows[crossing]
+            if tables:
+                states = states[crossing]
+
+        segments.sort()
+
+        merged = []
+        for start, end in segments:
+            if merged and start == merged[-1][1] + 1:
+                merged[-1] = (merged[-1][0], end)
+            else:
+                merged.append((start, end))
+        return merged
+
+    def __block_coords(self, prefixes: List[int], level: int) -> np.ndarray:
+        """
+        Computes the cubes of the blocks of 2^(dimensions * level) distances with the given prefixes: as the curve
+        is self-similar, the cube of the block of prefix h is the point at distance h of the curve of order
+        order - level, scaled by 2^level.
+
+        :param prefixes: A list of block prefixes.
+        :param level: The level of the blocks.
+        :return: An array of shape (blocks, dimensions) of the coordinates of the cubes, in units of 2^level.
+        """
+        if level not in self.__prefix_curves:
+            self.__prefix_curves[level] = HilbertCurve(self.order - level, self.dimensions)
+        curve = self.__prefix_curves[level]
+
+        if len(prefixes) < MIN_VECTORIZED_BATCH or curve.order > MAX_VECTORIZED_ORDER:
+            coords = [curve.hc.point_from_distance(prefix) for prefix in prefixes]
+            return np.array(coords, dtype=np.uint64 if curve.order <= MAX_VECTORIZED_ORDER else object)
+        return curve.__coords_from_distances(prefixes)
+
+    def __state_tables(self) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Computes the states of the curve, built once per curve.
+
+        A block of the curve visits the orthants of its cube in one of a few orders, its state (4 in 2D, 24 in 3D),
+        and the states of its sub-blocks only depend on its own state.
+        As the curve is self-similar, the cube of the block of prefix h of a curve of order m + k is the point
+        at distance h of the curve of order m, so the states are discovered on low-order curves.
+
+        :return: The orthants visited by every state, as an array of shape (states, 2^dimensions, dimensions)
+                 of 0/1 offsets, and the states of the sub-blocks, as an array of shape (states, 2^dimensions).
+        """
+        if self.__tables is not None:
+            return self.__tables
+
+        children = 1 << self.dimensions
+        curves = {}
+
+        def visit_order(prefix: int, depth: int) -> Tuple[Tuple[int, ...], ...]:
+            # The orthants visited by the block of the given prefix of a curve of order depth.
+            if depth + 1 not in curves:
+                curves[depth + 1] = HilbertCurve(depth + 1, self.dimensions)
+            points = curves[depth + 1].points_from_distances([(prefix << self.dimensions) | c for c in range(children)])
+            return tuple(tuple(coord & 1 for coord in point.as_tuple()) for point in points)
+
+        root = visit_order(0, 0)
+        states = {root: 0}
+        representatives = [(0, 0)]
+        orthants = [root]
+        transitions = []
+        while len(transitions) < len(orthants):
+            prefix, depth = representatives[len(transitions)]
+            row = []
+            for c in range(children):
+                child = (prefix << self.dimensions) | c
+                order = visit_order(child, depth + 1)
+                if order not in states:
+                    states[order] = len(orthants)
+                    representatives.append((child, depth + 1))
+                    orthants.append(order)
+                row.append(states[order])
+            transitions.append(row)
+
+        self.__tables = (np.array(orthants, dtype=np.uint8), np.array(transitions, dtype=np.intp))
+        return self.__tables
+
+
+def _coords_to_transpose(coords: np.ndarray, order: int) -> np.ndarray:
+    """
+    Applies the inverse Skilling transform to an array of points, row by row.
+
+    :param coords: An array of shape (points, dimensions) of uint64 coordinates.
+    :param order: The order of the Hilbert curve.
+    :return: The transposed Hilbert distances, as an array of the same shape.
+    """
+    x = coords.copy()
+    dimensions = x.shape[1]
+    m = 1 << (order - 1)
+
+    # Inverse undo excess work
+    q = m
+    while q > 1:
+        _exchange_or_invert(x, range(dimensions), np.uint64(q))
+        q >>= 1
+
+    # Gray encode
+    for i in range(1, dimensions):
+        x[:, i] ^= x[:, i - 1]
+    t = np.zeros(x.shape[0], dtype=np.uint64)
+    q = m
+    while q > 1:
+        t ^= np.where(x[:, dimensions - 1] & np.uint64(q), np.uint64(q - 1), np.uint64(0))
+        q >>= 1
+    x ^= t[:, None]
+
+    return x
+
+
+def _transpose_to_coords(x: np.ndarray, order: int) -> np.ndarray:
+    """
+    Applies the Skilling transform to an array of transposed Hilbert distances, row by row.
+
+    :param x: An array of shape (points, dimensions) of uint64 transposed distances.
+    :param order: The order of the Hilbert curve.
+    :return: The coordinates of the points, as an array of the same shape.
+    """
+    x = x.copy()
+    dimensions = x.shape[1]
+
+    # Gray decode by H ^ (H/2)
+    t = x[:, dimensions - 1] >> np.uint64(1)
+    for i in range(dimensions - 1, 0, -1):
+        x[:, i] ^= x[:, i - 1]
+    x[:, 0] ^= t
+
+    # Undo excess work
+    q = 2
+    while q != 2 << (order - 1):
+        _exchange_or_invert(x, range(dimensions - 1, -1, -1), np.uint64(q))
+        q <<= 1
+
+    return x
+
+
+def _exchange_or_invert(x: np.ndarray, dimensions: Iterable[int], q: np.uint64):
+    """
+    Runs one step of the Skilling transform in place: for every dimension i, the low bits of the first
+    coordinate are inverted if bit q of coordinate i is set, and exchanged with those of coordinate i otherwise.
+
+    :param x: An array of shape (points, dimensions) of uint64 values.
+    :param dimensions: The order in which the dimensions are processed.
+    :param q: The current bit.
+    """
+    p = q - np.uint64(1)
+    for i in dimensions:
+        is_set = (x[:, i] & q) != 0
+        if i == 0:
+            x[:, 0] = np.where(is_set, x[:, 0] ^ p, x[:, 0])
+        else:
+            t = (x[:, 0] ^ x[:, i]) & p
+            x[:, 0] = np.where(is_set, x[:, 0] ^ p, x[:, 0] ^ t)
+            x[:, i] = np.where(is_set, x[:, i], x[:, i] ^ t)
+
+
+def _transpose_to_words(x: np.ndarray, order: int) -> np.ndarray:
+    """
+    Interleaves the bits of transposed Hilbert distances into integers split in 64-bit words.
+    Bit j (from the most significant) of coordinate i is bit j * dimensions + i (from the most significant) of the distance.
+
+    :param x: An array of shape (points, dimensions) of uint64 transposed distances.
+    :param order: The order of the Hilbert curve.
+    :return: An array of shape (points, words) of uint64 words, the least significant first.
+    """
+    dimensions = x.shape[1]
+    total_bits = order * dimensions
+    words = np.zeros((x.shape[0], (total_bits + WORD_BITS - 1) // WORD_BITS), dtype=np.uint64)
+    for j in range(order):
+        for i in range(dimensions):
+            bit = total_bits - 1 - (j * dimensions + i)
+            words[:, bit // WORD_BITS] |= ((x[:, i] >> np.uint64(order - 1 - j)) & np.uint64(1)) << np.uint64(bit % WORD_BITS)
+    return words
+
+
+def _words_to_transpose(words: np.ndarray, order: int, dimensions: int) -> np.ndarray:
+    """
+    Splits the bits of Hilbert distances into their transposes, reversing `_transpose_to_words`.
+
+    :param words: An array of shape (points, words) of uint64 words, the least significant first.
+    :param order: The order of the Hilbert curve.
+    :param dimensions: The number of dimensions of the Hilbert curve.
+    :return: An array of shape (points, dimensions) of uint64 transposed distances.
+    """
+    total_bits = order * dimensions
+    x = np.zeros((words.shape[0], dimensions), dtype=np.uint64)
+    for j in range(order):
+        for i in range(dimensions):
+            bit = total_bits - 1 - (j * dimensions + i)
+            x[:, i] |= ((words[:, bit // WORD_BITS] >> np.uint64(bit % WORD_BITS)) & np.uint64(1)) << np.uint64(order - 1 - j)
+    return x
+
+
+def _words_to_integers(words: np.ndarray) -> List[int]:
+    """
+    Assembles integers from their 64-bit words.
+
+    :param words: An array of shape (points, words) of uint64 words, the least significant first.
+    :return: A list of Python integers.
+    """
+    if words.shape[1] == 1:
+        return words[:, 0].tolist()
+
+    integers = words[:, 0].astype(object)
+    for k in range(1, words.shape[1]):
+        integers += words[:, k].astype(object) << (WORD_BITS * k)
+    return integers.tolist()
+
+
+def _integers_to_words(integers: List[int], total_bits: int) -> np.ndarray:
+    """
+    Splits integers into 64-bit words.
+
+    :param integers: A list of non-negative Python integers of at most `total_bits` bits.
+    :param total_bits: The number of bits of the integers.
+    :return: An array of shape (points, words) of uint64 words, the least significant first.
+    """
+    count = (total_bits + WORD_BITS - 1) // WORD_BITS
+    if count == 1:
+        return np.array(integers, dtype=np.uint64).reshape(len(integers), 1)
 
-        return min(perimeter_distances), max(perimeter_distances)
+    integers = np.array(integers, dtype=object)
+    mask = (1 << WORD_BITS) - 1
+    return np.stack([((integers >> (WORD_BITS * k)) & mask).astype(np.uint64) for k in range(count)], axis=1)
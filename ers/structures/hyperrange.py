@@ -1,10 +1,24 @@
 import functools
+import struct
 from itertools import product
-from typing import List
+from typing import Iterator, List, Tuple
 
 from ers.structures.point import Point
 from ers.util.serialization.serialization import ObjectToBytes, BytesToObject
 
+LABEL_ENCODING_JSON = "json"
+LABEL_ENCODING_BINARY = "binary"
+LABEL_ENCODINGS = (LABEL_ENCODING_JSON, LABEL_ENCODING_BINARY)
+
+# Binary labels: a tag byte (JSON labels always start with "["), the number of dimensions, the width in bytes of
+# every coordinate, then the start and end coordinates as little-endian unsigned integers.
+BINARY_LABEL_TAG = 0x00
+BINARY_LABEL_HEADER = struct.Struct("<BBB")
+BINARY_LABEL_WIDTH = 8
+# The number of dimensions and the width are stored in one byte each.
+BINARY_LABEL_MAX_DIMENSIONS = 255
+BINARY_LABEL_MAX_WIDTH = 255
+
 
 @functools.total_ordering
 class HyperRange:
@@ -13,8 +27,13 @@ class HyperRange:
 
     This class provides methods to construct hyperranges from different inputs, check containment,
     retrieve boundary points, compute volume, and serialize/deserialize the object.
+
+    HyperRanges are immutable (their start, end and dimensions are read-only), so their hash, volume and
+    serialized bytes are computed once and cached.
     """
 
+    __slots__ = ("__start", "__end", "__dimensions", "__hash", "__volume", "__bytes", "__binary")
+
     def __init__(self, start: Point, end: Point):
         """
         Initializes a HyperRange with a start and end point.
@@ -23,18 +42,34 @@ class HyperRange:
         :param end: The ending point of the range.
         :raises ValueError: If the points have different dimensions or if start > end in any dimension.
         """
-        self.start = start
-        self.end = end
+        self.__start = start
+        self.__end = end
+        self.__hash = None
+        self.__volume = None
+        self.__bytes = None
+        self.__binary = None
 
         if start.dimensions() != end.dimensions():
             raise ValueError("Different dimensions for start and end points")
 
-        self.dimensions = start.dimensions()
+        self.__dimensions = start.dimensions()
 
-        for i in range(0, start.dimensions()):
-            if start[i] > end[i]:
+        for s, e in zip(start.as_tuple(), end.as_tuple()):
+            if s > e:
                 raise ValueError
 
+    @property
+    def start(self) -> Point:
+        return self.__start
+
+    @property
+    def end(self) -> Point:
+        return self.__end
+
+    @property
+    def dimensions(self) -> int:
+        return self.__dimensions
+
     @classmethod
     def from_coords(cls, start: List[int], end: List[int]):
         """
@@ -44,7 +79,27 @@ class HyperRange:
         :param end: List of integers representing the end coordinates.
         :return: A HyperRange instance.
         """
-        return cls(Point(start[:]), Point(end[:]))
+        return cls(Point(start), Point(end))
+
+    @classmethod
+    def from_valid_coords(cls, start: Tuple[int, ...], end: Tuple[int, ...]) -> "HyperRange":
+        """
+        Creates a HyperRange from coordinate tuples that are known to form a valid range (e.g., the nodes computed
+        by the implicit trees), without the checks of the constructor.
+
+        :param start: Tuple of integers representing the start coordinates.
+        :param end: Tuple of integers representing the end coordinates, of the same length and not below start.
+        :return: A HyperRange instance.
+        """
+        rng = cls.__new__(cls)
+        rng.__start = Point(start)
+        rng.__end = Point(end)
+        rng.__dimensions = len(start)
+        rng.__hash = None
+        rng.__volume = None
+        rng.__bytes = None
+        rng.__binary = None
+        return rng
 
     @classmethod
     def from_point(cls, p: Point):
@@ -54,7 +109,7 @@ class HyperRange:
         :param p: A Point object.
         :return: A HyperRange instance.
         """
-        return cls(Point(p.coords()), Point(p.coords()))
+        return cls(p, p)
 
     @classmethod
     def from_point_coords(cls, coords: List[int]):
@@ -64,7 +119,8 @@ class HyperRange:
         :param coords: List of coordinates.
         :return: A HyperRange instance.
         """
-        return cls(Point(coords[:]), Point(coords[:]))
+        point = Point(coords)
+        return cls(point, point)
 
     @classmethod
     def from_bits(cls, bits: List[int]):
@@ -79,22 +135,61 @@ class HyperRange:
     @classmethod
     def from_bytes(cls, b: bytes):
         """
-        Deserializes a HyperRange from bytes.
+        Deserializes a HyperRange from bytes, in either label encoding.
 
         :param b: Byte representation of a HyperRange.
         :return: A HyperRange instance.
         """
+        if b[0] == BINARY_LABEL_TAG:
+            _, dimensions, width = BINARY_LABEL_HEADER.unpack_from(b)
+            offset = BINARY_LABEL_HEADER.size
+            if width == BINARY_LABEL_WIDTH:
+                coords = struct.unpack_from(f"<{2 * dimensions}Q", b, offset)
+            else:
+                coords = [int.from_bytes(b[offset + i * width: offset + (i + 1) * width], "little") for i in range(2 * dimensions)]
+            return HyperRange(Point(coords[:dimensions]), Point(coords[dimensions:]))
+
         start, end = BytesToObject(b)
         return HyperRange(Point(start), Point(end))
 
-    def to_bytes(self) -> bytes:
+    def to_bytes(self, encoding: str = LABEL_ENCODING_JSON) -> bytes:
         """
         Serializes the HyperRange to bytes.
 
+        :param encoding: The label encoding, LABEL_ENCODING_JSON or LABEL_ENCODING_BINARY.
         :return: Byte representation of the HyperRange.
         """
+        if encoding == LABEL_ENCODING_BINARY:
+            return self.to_binary()
         return bytes(self)
 
+    def to_binary(self) -> bytes:
+        """
+        Serializes the HyperRange to its compact binary encoding. Coordinates use 8 bytes each,
+        or the width of the largest coordinate if it does not fit in 64 bits.
+
+        :return: Binary representation of the HyperRange.
+        :raises ValueError: If the range has more than BINARY_LABEL_MAX_DIMENSIONS dimensions, or a coordinate
+                            wider than BINARY_LABEL_MAX_WIDTH bytes.
+        :raises OverflowError: If a coordinate is negative.
+        """
+        if self.__binary is None:
+            if self.dimensions > BINARY_LABEL_MAX_DIMENSIONS:
+                raise ValueError(f"Binary labels support at most {BINARY_LABEL_MAX_DIMENSIONS} dimensions, "
+                                 f"the range has {self.dimensions}")
+
+            coords = self.start.as_tuple() + self.end.as_tuple()
+            try:
+                self.__binary = (BINARY_LABEL_HEADER.pack(BINARY_LABEL_TAG, self.dimensions, BINARY_LABEL_WIDTH)
+                                 + struct.pack(f"<{len(coords)}Q", *coords))
+            except struct.error:
+                width = (max(coords).bit_length() + 7) // 8
+                if width > BINARY_LABEL_MAX_WIDTH:
+                    raise ValueError(f"Binary labels support coordinates of at most {BINARY_LABEL_MAX_WIDTH} bytes")
+                self.__binary = (BINARY_LABEL_HEADER.pack(BINARY_LABEL_TAG, self.dimensions, width)
+                                 + b"".join(c.to_bytes(width, "little") for c in coords))
+        return self.__binary
+
     def contains_point(self, point: Point) -> bool:
         """
         Checks whether a given point is inside the range.
@@ -102,8 +197,20 @@ class HyperRange:
         :param point: A Point object.
         :return: True if the point is within the range, False otherwise.
         """
-        for i in range(self.dimensions):
-            if not (self.start[i] <= point[i] <= self.end[i]):
+        for s, c, e in zip(self.start.as_tuple(), point.as_tuple(), self.end.as_tuple()):
+            if not (s <= c <= e):
+                return False
+        return True
+
+    def intersects(self, other: "HyperRange") -> bool:
+        """
+        Checks whether this range shares at least one point with another range.
+
+        :param other: A HyperRange instance.
+        :return: True if the ranges overlap, False otherwise.
+        """
+        for s, e, other_s, other_e in zip(self.start.as_tuple(), self.end.as_tuple(), other.start.as_tuple(), other.end.as_tuple()):
+            if e < other_s or other_e < s:
                 return False
         return True
 
@@ -114,39 +221,42 @@ class HyperRange:
         :return: A list of Point objects.
         """
         ranges = [range(self.start[i], self.end[i] + 1) for i in range(self.dimensions)]
-        return [Point(list(p)) for p in product(*ranges)]
+        return [Point(p) for p in product(*ranges)]
 
-    def boundary_points(self) -> List[Point]:
+    def boundary_points(self) -> Iterator[Point]:
         """
-        Computes the boundary points of the range.
+        Generates the boundary points of the range, i.e. the points lying on at least one of its (d-1)-faces.
 
-        :return: A list of Point objects on the boundary.
+        :return: An iterator of Point objects on the boundary.
         """
-        corners = list(product(*[[self.start[i], self.end[i]] for i in range(self.dimensions)]))
-        corners.sort()
-
-        perimeter_points = []
-        for c in corners:
-            perimeter_points.append(Point(list(c)))
+        return (Point(c) for c in self.boundary_coords())
 
-        for i in range(len(corners)):
-            for j in range(i + 1, len(corners)):
-                diff_index = None
-                diffs = 0
-                for idx, (v1, v2) in enumerate(zip(corners[i], corners[j])):
-                    if v1 != v2:
-                        diff_index = idx
-                        diffs += 1
+    def boundary_coords(self) -> Iterator[Tuple[int, ...]]:
+        """
+        Generates the coordinates of the boundary points of the range, without allocating any Point object.
+        Every point is generated once: the points of the faces orthogonal to dimension i are only generated
+        if they lie strictly inside the range along the dimensions before i.
 
-                if diffs != 1:
-                    continue
+        :return: An iterator of coordinate tuples on the boundary.
+        """
+        start = self.start.as_tuple()
+        end = self.end.as_tuple()
+        for i in range(self.dimensions):
+            inner = [range(start[j] + 1, end[j]) for j in range(i)]
+            outer = [range(start[j], end[j] + 1) for j in range(i + 1, self.dimensions)]
+            for v in ((start[i],) if start[i] == end[i] else (start[i], end[i])):
+                yield from product(*inner, (v,), *outer)
 
-                point = list(corners[i][:])
-                for new_v in range(corners[i][diff_index] + 1, corners[j][diff_index]):
-                    point[diff_index] = new_v
-                    perimeter_points.append(Point(point[:]))
+    def boundary_size(self) -> int:
+        """
+        Computes the number of boundary points of the range in O(d), without enumerating them.
 
-        return perimeter_points
+        :return: The number of points generated by `boundary_coords`.
+        """
+        interior = 1
+        for s, e in zip(self.start.as_tuple(), self.end.as_tuple()):
+            interior *= max(0, e - s - 1)
+        return self.volume() - interior
 
     def volume(self) -> int:
         """
@@ -154,10 +264,12 @@ class HyperRange:
 
         :return: The number of points contained in the range.
         """
-        p = 1
-        for i in range(self.dimensions):
-            p *= (self.end[i] - self.start[i] + 1)
-        return p
+        if self.__volume is None:
+            p = 1
+            for s, e in zip(self.start.as_tuple(), self.end.as_tuple()):
+                p *= (e - s + 1)
+            self.__volume = p
+        return self.__volume
 
     def __str__(self):
         return "[(" + ", ".join([str(c) for c in self.start.coords()]) + "), (" + ", ".join([str(c) for c in self.end.coords()]) + ")]"
@@ -166,10 +278,14 @@ class HyperRange:
         return str(self)
 
     def __hash__(self):
-        return hash((self.start, self.end))
+        if self.__hash is None:
+            self.__hash = hash((self.start, self.end))
+        return self.__hash
 
     def __bytes__(self):
-        return ObjectToBytes([self.start.coords(), self.end.coords()])
+        if self.__bytes is None:
+            self.__bytes = ObjectToBytes([self.start.coords(), self.end.coords()])
+        return self.__bytes
 
     def __eq__(self, other):
         if not isinstance(other, HyperRange):
@@ -191,6 +307,9 @@ class HyperRange:
         if isinstance(other, Point):
             return self.contains_point(other)
         elif isinstance(other, HyperRange):
-            return self.contains_point(other.start) and self.contains_point(other.end)
+            for s, e, other_s, other_e in zip(self.start.as_tuple(), self.end.as_tuple(), other.start.as_tuple(), other.end.as_tuple()):
+                if other_s < s or e < other_e:
+                    return False
+            return True
         else:
             return NotImplemented
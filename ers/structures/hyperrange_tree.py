@@ -38,12 +38,24 @@ class HyperRangeTree:
         :param division_strategy: The strategy to divide the HyperRange.
         :return: A HyperRangeTree instance.
         """
+        with division_strategy.building():
+            return cls.__build(rng, division_strategy)
+
+    @classmethod
+    def __build(cls, rng: HyperRange, division_strategy: HyperRangeDivider) -> "HyperRangeTree":
+        """
+        Recursively constructs the subtree rooted at the given range.
+
+        :param rng: The HyperRange of the subtree root.
+        :param division_strategy: The strategy to divide the HyperRange.
+        :return: A HyperRangeTree instance.
+        """
         children = division_strategy.divide(rng)
 
         if not children:
             return cls([], rng, 0, division_strategy)
         else:
-            nodes = [HyperRangeTree.init(c, division_strategy) for c in children]
+            nodes = [HyperRangeTree.__build(c, division_strategy) for c in children]
             max_children_height = max([c.height for c in nodes])
             return cls(nodes, rng, max_children_height + 1, division_strategy)
 
@@ -71,6 +83,8 @@ class HyperRangeTree:
         """
         if self.rng in rng:
             return [(self.height, self.rng)]
+        elif not self.rng.intersects(rng):
+            return []
         else:
             result = []
             for child in self.children:
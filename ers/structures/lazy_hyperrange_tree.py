@@ -0,0 +1,119 @@
+from typing import Dict, List, Optional, Tuple
+
+from ers.structures.hyperrange import HyperRange
+from ers.structures.hyperrange_tree import HyperRangeTree
+from ers.util.hyperrange.divider import HyperRangeDivider
+
+
+class LazyHyperRangeTree(HyperRangeTree):
+    """
+    Represents an implicit HyperRangeTree whose nodes are never stored.
+
+    The children of a node are computed on demand by the division strategy, so constructing the tree is
+    independent of the size of the domain and `descend`, `rc`, `brc`, `src` and `urc` only visit the nodes
+    along the paths they return. The division strategy must be translation invariant (such as the uniform and
+    mid-overlap dividers), because the height of a node is derived from the shape of its range alone.
+    """
+
+    def __init__(self, rng: HyperRange, division_strategy: HyperRangeDivider,
+                 heights: Optional[Dict[Tuple[int, ...], int]] = None):
+        """
+        Initializes a LazyHyperRangeTree node.
+
+        :param rng: The HyperRange represented by this node.
+        :param division_strategy: The translation invariant strategy used to divide the HyperRange.
+        :param heights: The heights of the already seen range shapes, shared by all the nodes of a tree.
+        """
+        self.rng = rng
+        self.division_strategy = division_strategy
+        self.dimensions = self.rng.dimensions
+        self.heights = heights if heights is not None else {}
+        self.height = self.__height(rng)
+
+    @classmethod
+    def init(cls, rng: HyperRange, division_strategy: HyperRangeDivider) -> "LazyHyperRangeTree":
+        """
+        Constructs the root of an implicit HyperRangeTree. No other node is computed.
+
+        :param rng: The root HyperRange.
+        :param division_strategy: The translation invariant strategy to divide the HyperRange.
+        :return: A LazyHyperRangeTree instance.
+        """
+        return cls(rng, division_strategy)
+
+    @property
+    def children(self) -> List["LazyHyperRangeTree"]:
+        """
+        Computes the child nodes of this node.
+
+        :return: List of child LazyHyperRangeTree nodes.
+        """
+        return [LazyHyperRangeTree(c, self.division_strategy, self.heights) for c in self.division_strategy.divide(self.rng)]
+
+    def descend(self, rng: HyperRange) -> List[HyperRange]:
+        """
+        Retrieves all ranges that contain the given range, each of them once. With overlapping dividers a range
+        is reachable through several parents; its subtree is only visited the first time it is reached.
+
+        :param rng: The HyperRange to search within.
+        :return: A list of contained HyperRanges.
+        """
+        result = []
+        seen = set()
+
+        def helper(node: LazyHyperRangeTree):
+            if node.rng in seen or rng not in node.rng:
+                return
+            seen.add(node.rng)
+            result.append(node.rng)
+            for c in node.children:
+                helper(c)
+
+        helper(self)
+        return result
+
+    def src(self, rng: HyperRange) -> Optional[HyperRange]:
+        """
+        Finds the single range covering the given range, visiting every distinct range once.
+        Among the smallest covering ranges, the first one found in depth-first order is returned.
+
+        :param rng: The HyperRange to cover.
+        :return: The single HyperRange covering the given range.
+        """
+        best = None
+        seen = set()
+
+        def helper(node: LazyHyperRangeTree):
+            nonlocal best
+            if node.rng in seen or rng not in node.rng:
+                return
+            seen.add(node.rng)
+
+            covered = False
+            for c in node.children:
+                if rng in c.rng:
+                    covered = True
+                    helper(c)
+
+            if not covered and (best is None or node.rng.volume() < best.volume()):
+                best = node.rng
+
+        helper(self)
+        return best
+
+    def __height(self, rng: HyperRange) -> int:
+        """
+        Computes the height of the subtree rooted at the given range, memoized by the shape of the range.
+        Only one range per distinct shape is divided, which is O(height) ranges for the uniform dividers.
+
+        :param rng: The HyperRange of the node.
+        :return: The height of the node.
+        """
+        shape = tuple(rng.end[i] - rng.start[i] for i in range(rng.dimensions))
+        if shape not in self.heights:
+            children = self.division_strategy.divide(rng)
+            if not children:
+                self.heights[shape] = 0
+            else:
+                self.heights[shape] = max([self.__height(c) for c in children]) + 1
+        return self.heights[shape]
@@ -1,20 +1,27 @@
 import functools
-from typing import List
+from typing import Sequence, Tuple
 
 from ers.util.serialization import serialization
 
 
 @functools.total_ordering
 class Point:
+    __slots__ = ("__coords", "__hash", "__bytes")
+
     def dimensions(self):
-        return self.__dimensions
+        return len(self.__coords)
 
     def coords(self):
-        return self.__coords[:]
+        return list(self.__coords)
+
+    def as_tuple(self) -> Tuple[int, ...]:
+        # The coordinates without a copy; points are immutable.
+        return self.__coords
 
-    def __init__(self, coords: List[int]):
-        self.__coords = coords
-        self.__dimensions = len(coords)
+    def __init__(self, coords: Sequence[int]):
+        self.__coords = tuple(coords)
+        self.__hash = None
+        self.__bytes = None
 
         if len(self.__coords) == 0:
             raise ValueError("Cannot create zero-dimensional point")
@@ -22,13 +29,13 @@ class Point:
     def __eq__(self, other):
         if not isinstance(other, Point):
             return False
-        return self.__dimensions == other.__dimensions and self.__coords == other.__coords
+        return self.__coords == other.__coords
 
     def __lt__(self, other):
         if not isinstance(other, Point):
             return NotImplemented
 
-        if self.__dimensions != other.__dimensions:
+        if len(self.__coords) != len(other.__coords):
             return NotImplemented
 
         for v1, v2 in zip(self.__coords, other.__coords):
@@ -38,16 +45,22 @@ class Point:
         return True
 
     def __hash__(self):
-        return hash(tuple(self.__coords))
+        if self.__hash is None:
+            self.__hash = hash(self.__coords)
+        return self.__hash
 
     def __bytes__(self):
-        return serialization.ObjectToBytes(self.__coords)
+        if self.__bytes is None:
+            self.__bytes = serialization.ObjectToBytes(list(self.__coords))
+        return self.__bytes
 
     def __str__(self):
-        return "Point(" + str(self.__coords) + ")"
+        return "Point(" + str(list(self.__coords)) + ")"
 
     def __repr__(self):
         return str(self)
 
     def __getitem__(self, index):
+        if isinstance(index, slice):
+            return list(self.__coords[index])
         return self.__coords[index]
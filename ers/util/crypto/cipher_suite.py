@@ -0,0 +1,69 @@
+from typing import List
+
+from ers.util.crypto.crypto import (
+    SymmetricEncryptBatch,
+    SymmetricDecryptBatch,
+    SymmetricEncryptCTRBatch,
+    SymmetricDecryptCTRBatch,
+)
+
+
+class CipherSuite:
+    """
+    Abstract base class for the symmetric encryption of the values stored in an encrypted index.
+
+    This class should be subclassed to implement specific ciphers. Implementations must be stateless,
+    such that they can be sent to worker processes.
+    """
+
+    def encrypt_batch(self, key: bytes, plaintexts: List[bytes]) -> List[bytes]:
+        """
+        Encrypts many plaintexts under the same key.
+
+        :param key: The encryption key.
+        :param plaintexts: The plaintexts to encrypt.
+        :return: The ciphertexts, in the same order as the plaintexts.
+        """
+        pass
+
+    def decrypt_batch(self, key: bytes, ciphertexts: List[bytes]) -> List[bytes]:
+        """
+        Decrypts many ciphertexts under the same key.
+
+        :param key: The encryption key.
+        :param ciphertexts: The ciphertexts to decrypt.
+        :return: The plaintexts, in the same order as the ciphertexts.
+        """
+        pass
+
+
+class CBCCipherSuite(CipherSuite):
+    """
+    AES-CBC with PKCS7 padding and a random 16-byte IV appended to the ciphertext.
+    This is the original format of the encrypted indexes; a 5-byte value becomes a 32-byte ciphertext.
+    """
+
+    def encrypt_batch(self, key: bytes, plaintexts: List[bytes]) -> List[bytes]:
+        return SymmetricEncryptBatch(key, plaintexts)
+
+    def decrypt_batch(self, key: bytes, ciphertexts: List[bytes]) -> List[bytes]:
+        return SymmetricDecryptBatch(key, ciphertexts)
+
+
+class CTRCipherSuite(CipherSuite):
+    """
+    AES-CTR with a random 12-byte nonce appended to the ciphertext. There is no padding,
+    so a 5-byte value becomes a 17-byte ciphertext.
+    """
+
+    def encrypt_batch(self, key: bytes, plaintexts: List[bytes]) -> List[bytes]:
+        return SymmetricEncryptCTRBatch(key, plaintexts)
+
+    def decrypt_batch(self, key: bytes, ciphertexts: List[bytes]) -> List[bytes]:
+        return SymmetricDecryptCTRBatch(key, ciphertexts)
+
+
+CIPHER_SUITES = {
+    "aes-cbc": CBCCipherSuite,
+    "aes-ctr": CTRCipherSuite,
+}
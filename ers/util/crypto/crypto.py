@@ -1,6 +1,7 @@
 
 
 import os
+from typing import Iterable, List
 
 from cryptography.hazmat.primitives import hashes, hmac, constant_time
 from cryptography.hazmat.primitives import padding as sym_padding
@@ -8,6 +9,8 @@ from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
 from cryptography.hazmat.primitives.kdf.hkdf import HKDF
 from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
 
+CTR_NONCE_BYTES = 12
+
 
 def check_type(arg, corr_type, param_name: str, func_name: str) -> None:
     """
@@ -52,6 +55,26 @@ def HMAC(key: bytes, data: bytes) -> bytes:
     return h.finalize()
 
 
+def HMACBatch(key: bytes, data: Iterable[bytes]) -> List[bytes]:
+    """
+    Compute the SHA-512 HMAC of many messages under the same key.
+    The keyed HMAC context is set up once and copied for every message.
+
+    Params:
+        > key  - bytes
+        > data - iterable of bytes
+
+    Returns: The HMAC of every message, in the same order (list of bytes)
+    """
+    keyed = hmac.HMAC(key, hashes.SHA512())
+    macs = []
+    for d in data:
+        h = keyed.copy()
+        h.update(d)
+        macs.append(h.finalize())
+    return macs
+
+
 def HMACEqual(hmac1: bytes, hmac2: bytes) -> bool:
     """
     Check if an HMAC is correct in constant time wrt the number of matching bytes.
@@ -154,6 +177,53 @@ def SymmetricEncrypt(key: bytes, plaintext: bytes) -> bytes:
     return ciphertext + iv
 
 
+def SymmetricEncryptBatch(key: bytes, plaintexts: List[bytes]) -> List[bytes]:
+    """
+    Encrypt many plaintexts at once, producing exactly the same format as SymmetricEncrypt
+    (AES-CBC, PKCS7 padding, IV appended as the last 16 bytes).
+
+    Instead of building a new Cipher, padder and IV per plaintext, all IVs are drawn from a single
+    random buffer and one AES-ECB context is reused for the whole batch. The CBC chaining is done
+    round by round: the i-th block of every plaintext is XOR-ed with its predecessor and all of them
+    are encrypted with a single call.
+
+    Params:
+        > key        - bytes (128 bits)
+        > plaintexts - list of bytes
+
+    Returns: A list of ciphertexts, in the same order as the plaintexts (list of bytes)
+    """
+    if not plaintexts:
+        return []
+
+    padded = [_pkcs7_pad(plaintext) for plaintext in plaintexts]
+    ivs = SecureRandom(16 * len(padded))
+
+    encryptor = Cipher(algorithms.AES(key), modes.ECB()).encryptor()
+
+    chains = [ivs[16 * i: 16 * (i + 1)] for i in range(len(padded))]
+    ciphertexts = [bytearray() for _ in range(len(padded))]
+
+    active = list(range(len(padded)))
+    offset = 0
+    while active:
+        blocks = b"".join(padded[i][offset: offset + 16] for i in active)
+        previous = b"".join(chains[i] for i in active)
+        encrypted = encryptor.update(_xor(blocks, previous))
+
+        for j, i in enumerate(active):
+            block = encrypted[16 * j: 16 * (j + 1)]
+            chains[i] = block
+            ciphertexts[i] += block
+
+        offset += 16
+        active = [i for i in active if len(padded[i]) > offset]
+
+    encryptor.finalize()
+
+    return [bytes(ct) + ivs[16 * i: 16 * (i + 1)] for i, ct in enumerate(ciphertexts)]
+
+
 def SymmetricDecrypt(key: bytes, ciphertext: bytes) -> bytes:
     """
     Decrypt the ciphertext using the key. The last 16 bytes of the ciphertext should be the IV.
@@ -181,6 +251,153 @@ def SymmetricDecrypt(key: bytes, ciphertext: bytes) -> bytes:
     return plaintext
 
 
+def SymmetricDecryptBatch(key: bytes, ciphertexts: List[bytes]) -> List[bytes]:
+    """
+    Decrypt many ciphertexts produced by SymmetricEncrypt (or SymmetricEncryptBatch) at once.
+
+    CBC decryption of every block only depends on the ciphertext itself, so the blocks of all the
+    ciphertexts are decrypted with a single call to one AES-ECB context and XOR-ed with their
+    predecessors (the IV for the first block).
+
+    Params:
+        > key         - bytes
+        > ciphertexts - list of bytes
+
+    Returns: A list of plaintexts, in the same order as the ciphertexts (list of bytes).
+             Raises a ValueError if the padding is wrong after decryption (which will happen if the wrong key is used).
+    """
+    if not ciphertexts:
+        return []
+
+    bodies = b"".join(ct[:-16] for ct in ciphertexts)
+    previous = b"".join(ct[-16:] + ct[:-32] for ct in ciphertexts)
+
+    decryptor = Cipher(algorithms.AES(key), modes.ECB()).decryptor()
+    padded = _xor(decryptor.update(bodies) + decryptor.finalize(), previous)
+
+    plaintexts = []
+    offset = 0
+    for ct in ciphertexts:
+        length = len(ct) - 16
+        plaintexts.append(_pkcs7_unpad(padded[offset: offset + length]))
+        offset += length
+    return plaintexts
+
+
+def SymmetricEncryptCTR(key: bytes, plaintext: bytes) -> bytes:
+    """
+    Encrypt the plaintext using AES-CTR mode with the provided key and a random 96-bit nonce.
+    No padding is needed, so the ciphertext is as long as the plaintext, plus the nonce as the last 12 bytes.
+    The 128-bit initial counter block is the nonce followed by a 32-bit block counter starting at 0.
+
+    Params:
+        > key - bytes (128 bits)
+        > plaintext - bytes
+
+    Returns: A ciphertext using AES-CTR mode with the provided key and nonce (bytes)
+    """
+    nonce = SecureRandom(CTR_NONCE_BYTES)
+    encryptor = Cipher(algorithms.AES(key), modes.CTR(nonce + bytes(16 - CTR_NONCE_BYTES))).encryptor()
+    return encryptor.update(plaintext) + encryptor.finalize() + nonce
+
+
+def SymmetricDecryptCTR(key: bytes, ciphertext: bytes) -> bytes:
+    """
+    Decrypt a ciphertext produced by SymmetricEncryptCTR. The last 12 bytes of the ciphertext should be the nonce.
+
+    Params:
+        > key        - bytes
+        > ciphertext - bytes
+
+    Returns: A plaintext, decrypted from the given ciphertext, key and nonce (bytes).
+    """
+    nonce = ciphertext[-CTR_NONCE_BYTES:]
+    decryptor = Cipher(algorithms.AES(key), modes.CTR(nonce + bytes(16 - CTR_NONCE_BYTES))).decryptor()
+    return decryptor.update(ciphertext[:-CTR_NONCE_BYTES]) + decryptor.finalize()
+
+
+def SymmetricEncryptCTRBatch(key: bytes, plaintexts: List[bytes]) -> List[bytes]:
+    """
+    Encrypt many plaintexts at once, producing exactly the same format as SymmetricEncryptCTR.
+    The nonces are drawn from a single random buffer and the key streams of all the plaintexts are
+    generated with a single call to one AES-ECB context.
+
+    Params:
+        > key        - bytes (128 bits)
+        > plaintexts - list of bytes
+
+    Returns: A list of ciphertexts, in the same order as the plaintexts (list of bytes)
+    """
+    nonces = SecureRandom(CTR_NONCE_BYTES * len(plaintexts))
+    nonces = [nonces[CTR_NONCE_BYTES * i: CTR_NONCE_BYTES * (i + 1)] for i in range(len(plaintexts))]
+    return [ct + nonce for ct, nonce in zip(_ctr_xor_batch(key, plaintexts, nonces), nonces)]
+
+
+def SymmetricDecryptCTRBatch(key: bytes, ciphertexts: List[bytes]) -> List[bytes]:
+    """
+    Decrypt many ciphertexts produced by SymmetricEncryptCTR (or SymmetricEncryptCTRBatch) at once.
+
+    Params:
+        > key         - bytes
+        > ciphertexts - list of bytes
+
+    Returns: A list of plaintexts, in the same order as the ciphertexts (list of bytes).
+    """
+    nonces = [ct[-CTR_NONCE_BYTES:] for ct in ciphertexts]
+    return _ctr_xor_batch(key, [ct[:-CTR_NONCE_BYTES] for ct in ciphertexts], nonces)
+
+
+def _ctr_xor_batch(key: bytes, data: List[bytes], nonces: List[bytes]) -> List[bytes]:
+    """
+    A helper function that XORs every message with its AES-CTR key stream.
+    """
+    if not data:
+        return []
+
+    counter_blocks = b"".join(
+        nonce + i.to_bytes(16 - CTR_NONCE_BYTES, "big")
+        for d, nonce in zip(data, nonces)
+        for i in range((len(d) + 15) // 16)
+    )
+    encryptor = Cipher(algorithms.AES(key), modes.ECB()).encryptor()
+    key_stream = encryptor.update(counter_blocks) + encryptor.finalize()
+
+    results = []
+    offset = 0
+    for d in data:
+        if d:
+            results.append(_xor(d, key_stream[offset: offset + len(d)]))
+        else:
+            results.append(b"")
+        offset += (len(d) + 15) // 16 * 16
+    return results
+
+
+def _pkcs7_pad(data: bytes) -> bytes:
+    """
+    A helper function that pads data to the AES block size, identically to PKCS7(128).padder().
+    """
+    pad = 16 - len(data) % 16
+    return data + bytes([pad]) * pad
+
+
+def _pkcs7_unpad(data: bytes) -> bytes:
+    """
+    A helper function that removes the padding added by _pkcs7_pad, identically to PKCS7(128).unpadder().
+    """
+    pad = data[-1] if data else 0
+    if not 1 <= pad <= 16 or data[-pad:] != bytes([pad]) * pad:
+        raise ValueError("Invalid padding bytes.")
+    return data[:-pad]
+
+
+def _xor(a: bytes, b: bytes) -> bytes:
+    """
+    A helper function that XORs two byte strings of equal length.
+    """
+    return (int.from_bytes(a, "big") ^ int.from_bytes(b, "big")).to_bytes(len(a), "big")
+
+
 def SecureRandom(num_bytes: int) -> bytes:
     """
     Given a length, return that many randomly generated bytes. Can be used for an IV or symmetric key.
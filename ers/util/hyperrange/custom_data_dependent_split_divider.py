@@ -1,5 +1,7 @@
-from collections import defaultdict
-from typing import List, Dict
+from contextlib import contextmanager
+from typing import Dict, Iterator, List
+
+import numpy as np
 
 from ers.structures.hyperrange import HyperRange
 from ers.structures.point import Point
@@ -17,6 +19,31 @@ class CustomDataDependentSplitDivider(HyperRangeDivider):
         self.points = list(plaintext_mm.keys())
         self.uniform = CustomUniformSplitDivider(num_splits_per_dim)
 
+        # The coordinates of the points, one row per point. Distances of Hilbert curves may not fit in 64 bits.
+        coords = [point.as_tuple() for point in self.points]
+        fits = all(0 <= c < 2 ** 64 for point in coords for c in point)
+        self.coords = np.array(coords, dtype=np.uint64 if fits else object)
+        if not coords:
+            self.coords = self.coords.reshape(0, 0)
+
+        # While a tree is built, the coordinates of the points of every child returned by `divide`, until the child
+        # is divided in turn, so that every division only scans the points of its own node.
+        self.partitions: Dict[HyperRange, np.ndarray] = {}
+        self.partitioning = False
+
+    @contextmanager
+    def building(self) -> Iterator[None]:
+        """
+        Partitions the points among the nodes while a tree is built. The divisions made afterwards (e.g. by
+        `HyperRangeTree.urc`) scan all the points, so that the partitions do not grow after the build.
+        """
+        self.partitioning = True
+        try:
+            yield
+        finally:
+            self.partitioning = False
+            self.partitions.clear()
+
     def _num_splits_for_dim(self, dim: int):
         """
         Returns the number of splits for a given dimension.
@@ -26,33 +53,57 @@ class CustomDataDependentSplitDivider(HyperRangeDivider):
         """
         return self.num_splits_per_dim[dim]
 
-    def _compute_point_densities(self, bounding_box: HyperRange) -> dict[int, dict[int, int]]:
-        densities = defaultdict(lambda: defaultdict(int))
-        for point in self.points:
-            if point in bounding_box:
-                for dim in range(point.dimensions()):
-                    densities[dim][point[dim]] += 1
+    def _points_within(self, coords: np.ndarray, bounding_box: HyperRange) -> np.ndarray:
+        """
+        Selects the points within a range. Like `HyperRange.contains_point`, only the first
+        `bounding_box.dimensions` coordinates of the points are compared.
+
+        :param coords: The coordinates of the points, one row per point.
+        :param bounding_box: The range.
+        :return: The coordinates of the points within the range.
+        """
+        if len(coords) == 0:
+            return coords
 
-        return {dim: dict(counts) for dim, counts in densities.items()}
+        dimensions = min(bounding_box.dimensions, coords.shape[1])
+        start = np.array(bounding_box.start.as_tuple()[:dimensions], dtype=coords.dtype)
+        end = np.array(bounding_box.end.as_tuple()[:dimensions], dtype=coords.dtype)
+        mask = np.all((start <= coords[:, :dimensions]) & (coords[:, :dimensions] <= end), axis=1)
+        return coords[mask]
+
+    def _compute_point_densities(self, coords: np.ndarray) -> dict[int, dict[int, int]]:
+        """
+        Counts the points at every coordinate value, per dimension.
+
+        :param coords: The coordinates of the points, one row per point.
+        :return: For every dimension, the number of points at every occupied coordinate value.
+        """
+        if len(coords) == 0:
+            return {}
+
+        densities = {}
+        for dim in range(coords.shape[1]):
+            values, counts = np.unique(coords[:, dim], return_counts=True)
+            densities[dim] = dict(zip(values.tolist(), counts.tolist()))
+
+        return densities
 
     @staticmethod
     def _divide_segment_by_density(start: int, end: int, dimension_distribution: dict[int, int], splits: int):
         if splits >= end - start + 1:
             return [(i, i) for i in range(start, end + 1)]
 
-        values = list(range(start, end + 1))
-        densities = [dimension_distribution.get(i, 0) for i in values]
+        # Cumulative distribution function (CDF) over the occupied values only: cdf[k] points are at most values[k]
+        values = sorted(v for v in dimension_distribution if start <= v <= end)
+        cdf = np.cumsum([dimension_distribution[v] for v in values], dtype=np.int64)
 
-        # Compute cumulative distribution function (CDF)
-        cdf = []
-        cumulative = 0
-        for density in densities:
-            cumulative += density
-            cdf.append(cumulative)
+        total_density = int(cdf[-1]) if len(values) else 0
 
-        total_density = cdf[-1]
+        target_densities = np.array([total_density * i // splits for i in range(1, splits)], dtype=np.int64)
 
-        target_densities = [total_density * i // splits for i in range(splits + 1)]
+        # The first offset from `start` where the CDF reaches every target density
+        first_reached = np.searchsorted(cdf, target_densities, side="left")
+        reached = [values[k] - start if target > 0 else 0 for k, target in zip(first_reached.tolist(), target_densities.tolist())]
 
         segment_points = [start]  # First point is always `start`
 
@@ -60,8 +111,8 @@ class CustomDataDependentSplitDivider(HyperRangeDivider):
         for i in range(1, splits):  # We already placed `start`, and will place `end` last
             remaining_needed = splits + 1 - len(segment_points)  # Points still needed
 
-            while cdf[idx] < target_densities[i] and (end - (start + idx) ) >= remaining_needed:
-                idx += 1
+            # Move to where the target density is reached, leaving at least one value for each remaining point
+            idx = max(idx, min(reached[i - 1], end - start - remaining_needed + 1))
 
             next_point = start + idx
             segment_points.append(next_point)
@@ -69,7 +120,6 @@ class CustomDataDependentSplitDivider(HyperRangeDivider):
 
         segment_points.append(end)
 
-
         # Construct segments
         # Avoid duplicates and ensure segments are disjoint
         segments = []
@@ -91,10 +141,14 @@ class CustomDataDependentSplitDivider(HyperRangeDivider):
         if self.num_splits_per_dim is not None:
             assert len(self.num_splits_per_dim) == rng.dimensions
 
-        density = self._compute_point_densities(rng)
+        coords = self.partitions.pop(rng, None)
+        if coords is None:
+            coords = self._points_within(self.coords, rng)
+
+        density = self._compute_point_densities(coords)
 
         if len(density.keys()) == 0:
-            return self.uniform.divide(rng)
+            return self._partition(coords, self.uniform.divide(rng))
 
         def helper(r: HyperRange, current_dim: int) -> List[HyperRange]:
             if current_dim >= r.dimensions:
@@ -127,4 +181,17 @@ class CustomDataDependentSplitDivider(HyperRangeDivider):
         result = helper(rng, 0)
         if rng in result:
             result.remove(rng)
-        return result
+        return self._partition(coords, result)
+
+    def _partition(self, coords: np.ndarray, children: List[HyperRange]) -> List[HyperRange]:
+        """
+        Records the points of every child of a node, selected among the points of the node, while a tree is built.
+
+        :param coords: The coordinates of the points within the node.
+        :param children: The children of the node.
+        :return: The children of the node.
+        """
+        if self.partitioning:
+            for child in children:
+                self.partitions[child] = self._points_within(coords, child)
+        return children
@@ -1,4 +1,5 @@
-from typing import List
+from contextlib import contextmanager
+from typing import Iterator, List
 
 from ers.structures.hyperrange import HyperRange
 
@@ -17,4 +18,12 @@ class HyperRangeDivider:
         :param rng: The HyperRange to be divided.
         :return: A list of smaller HyperRanges resulting from the division.
         """
-        pass
\ No newline at end of file
+        pass
+
+    @contextmanager
+    def building(self) -> Iterator[None]:
+        """
+        Encloses the construction of a tree, during which every node is divided once, top-down.
+        Dividers may keep state for the duration of the build; they must release it on exit.
+        """
+        yield
@@ -0,0 +1,60 @@
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator
+
+# The phases shared by the index builds of every scheme.
+PHASE_HILBERT_MAPPING = "hilbert_mapping"
+PHASE_TREE_CONSTRUCTION = "tree_construction"
+PHASE_DESCEND_AND_LABEL = "descend_and_label"
+PHASE_ENCRYPTION = "encryption"
+PHASES = (PHASE_HILBERT_MAPPING, PHASE_TREE_CONSTRUCTION, PHASE_DESCEND_AND_LABEL, PHASE_ENCRYPTION)
+
+# The objects counted during an index build: the tree nodes visited by the descents, the distinct labels,
+# the values and the hash computations (one HMAC per label and one hash per index entry).
+COUNT_NODES = "nodes"
+COUNT_LABELS = "labels"
+COUNT_VALUES = "values"
+COUNT_HASHES = "hashes"
+COUNTS = (COUNT_NODES, COUNT_LABELS, COUNT_VALUES, COUNT_HASHES)
+
+
+class BuildProfiler:
+    """
+    Accumulates the time spent in the phases of index builds and counters of the objects they produce.
+
+    The schemes wrap each phase of `build_index` in `phase` and report their counts with `count`.
+    Both only cost a few operations per call, so the profiler is always enabled.
+    """
+
+    def __init__(self):
+        self.times: Dict[str, float] = {}
+        self.counts: Dict[str, int] = {}
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        """
+        Times the enclosed block and adds its duration to the given phase.
+
+        :param name: The name of the phase, e.g. one of PHASES.
+        """
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.times[name] = self.times.get(name, 0.0) + time.perf_counter() - t0
+
+    def count(self, name: str, n: int = 1) -> None:
+        """
+        Adds to the given counter.
+
+        :param name: The name of the counter, e.g. one of COUNTS.
+        :param n: The amount to add.
+        """
+        self.counts[name] = self.counts.get(name, 0) + n
+
+    def reset(self) -> None:
+        """
+        Clears the times and the counters, e.g. before profiling another build.
+        """
+        self.times.clear()
+        self.counts.clear()
@@ -0,0 +1,24 @@
+from typing import Iterable, Iterator, Optional, Tuple
+
+from ers.util.storage.storage import EncryptedIndexStorage
+
+
+class DictStorage(EncryptedIndexStorage):
+    """
+    Keeps the encrypted index in memory, in a Python dictionary.
+    """
+
+    def __init__(self):
+        self.db = {}
+
+    def load(self, entries: Iterable[Tuple[bytes, bytes]]) -> None:
+        self.db = dict(entries)
+
+    def get(self, ct_label: bytes) -> Optional[bytes]:
+        return self.db.get(ct_label)
+
+    def items(self) -> Iterator[Tuple[bytes, bytes]]:
+        return iter(self.db.items())
+
+    def __len__(self) -> int:
+        return len(self.db)
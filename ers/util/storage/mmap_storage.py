@@ -0,0 +1,218 @@
+import heapq
+import mmap
+import os
+import shutil
+import struct
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+from ers.util.storage.storage import EncryptedIndexStorage
+
+MAGIC = b"ERSMMAP1"
+
+# magic, key size, number of entries
+HEADER = struct.Struct("<8sIQ")
+
+# value offset, value length
+RECORD_POINTER = struct.Struct("<QI")
+
+# The records are bucketed by the first two bytes of their key. The bucket table stores, for each
+# bucket, the index of its first record, such that a lookup only binary-searches within one bucket.
+BUCKET_BYTES = 2
+BUCKETS = 1 << (8 * BUCKET_BYTES)
+BUCKET_OFFSET = struct.Struct("<Q")
+
+# While the index is written, at most RUN_RECORDS records are sorted in memory at once, and each sorted run
+# is read back READ_RECORDS records at a time when the runs are merged.
+RUN_RECORDS = 1 << 16
+READ_RECORDS = 1 << 10
+
+
+class MmapStorage(EncryptedIndexStorage):
+    """
+    Keeps the encrypted index in a file which is memory-mapped and never loaded fully into memory.
+
+    The file layout is:
+        * a header (magic, key size, number of entries);
+        * a bucket table with the index of the first record of every 2-byte key prefix;
+        * the fixed-size records (key, value offset, value length) sorted by key;
+        * the values, back to back.
+
+    All keys must have the same size (64 bytes for SHA-512 labels) and be at least 2 bytes long.
+    If the file already exists, it is opened as a prebuilt index.
+    The index is written from a stream of entries with an external merge sort, so it never has to fit in memory.
+    """
+
+    def __init__(self, path: str):
+        """
+        Initializes the storage backed by the given file.
+
+        :param path: The path of the index file.
+        """
+        self.path = path
+        self._file = None
+        self._mm = None
+        self._key_size = 0
+        self._count = 0
+
+        if os.path.exists(path):
+            self._open()
+
+    def _open(self):
+        """
+        Memory-maps the index file and reads its header.
+        """
+        self._file = open(self.path, "rb")
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, self._key_size, self._count = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{self.path} is not an encrypted index file")
+
+        self._record_size = self._key_size + RECORD_POINTER.size
+        self._records_offset = HEADER.size + (BUCKETS + 1) * BUCKET_OFFSET.size
+
+    def load(self, entries: Iterable[Tuple[bytes, bytes]]) -> None:
+        """
+        Writes the index file from a stream of entries, without holding them in memory.
+
+        The values are appended to a temporary file as they arrive, while their records are sorted in runs of
+        RUN_RECORDS records which are spilled to another temporary file. The runs are then merged into the
+        record region of the index file, and the values are copied after it.
+        """
+        self.close()
+
+        values_path = f"{self.path}.values"
+        runs_path = f"{self.path}.runs"
+        try:
+            with open(values_path, "wb") as values_file, open(runs_path, "wb") as runs_file:
+                key_size, count, buckets, runs = self._spill(entries, values_file, runs_file)
+
+            record_size = key_size + RECORD_POINTER.size
+            values_offset = HEADER.size + (BUCKETS + 1) * BUCKET_OFFSET.size + count * record_size
+
+            for i in range(BUCKETS):
+                buckets[i + 1] += buckets[i]
+
+            with open(self.path, "wb") as f:
+                f.write(HEADER.pack(MAGIC, key_size, count))
+                f.write(b"".join(BUCKET_OFFSET.pack(b) for b in buckets))
+
+                run_readers = [_read_run(runs_path, start, length, record_size) for start, length in runs]
+                for record in heapq.merge(*run_readers):
+                    offset, length = RECORD_POINTER.unpack_from(record, key_size)
+                    f.write(record[:key_size] + RECORD_POINTER.pack(values_offset + offset, length))
+
+                with open(values_path, "rb") as values_file:
+                    shutil.copyfileobj(values_file, f)
+        finally:
+            for path in (values_path, runs_path):
+                if os.path.exists(path):
+                    os.remove(path)
+
+        self._open()
+
+    @staticmethod
+    def _spill(entries: Iterable[Tuple[bytes, bytes]], values_file, runs_file) -> Tuple[int, int, List[int], List[Tuple[int, int]]]:
+        """
+        Appends the values to the values file and the records, in sorted runs, to the runs file.
+        The value offsets of the records are relative to the start of the values.
+
+        :return: The key size, the number of entries, the number of records of every bucket
+                 (shifted by one, to be accumulated into the bucket table) and the (offset, records) of every run.
+        """
+        key_size = None
+        count = 0
+        value_offset = 0
+        buckets = [0] * (BUCKETS + 1)
+        runs = []
+        run = []
+
+        def spill_run():
+            run.sort()
+            runs.append((runs_file.tell(), len(run)))
+            runs_file.write(b"".join(run))
+            run.clear()
+
+        for ct_label, ct_value in entries:
+            if key_size is None:
+                key_size = len(ct_label)
+            if len(ct_label) != key_size or key_size < BUCKET_BYTES:
+                raise ValueError(f"All labels must have the same size of at least {BUCKET_BYTES} bytes")
+
+            buckets[int.from_bytes(ct_label[:BUCKET_BYTES], "big") + 1] += 1
+            run.append(ct_label + RECORD_POINTER.pack(value_offset, len(ct_value)))
+            values_file.write(ct_value)
+            value_offset += len(ct_value)
+            count += 1
+
+            if len(run) >= RUN_RECORDS:
+                spill_run()
+
+        if run:
+            spill_run()
+
+        return key_size if key_size is not None else BUCKET_BYTES, count, buckets, runs
+
+    def get(self, ct_label: bytes) -> Optional[bytes]:
+        if self._mm is None or len(ct_label) != self._key_size:
+            return None
+
+        bucket = int.from_bytes(ct_label[:BUCKET_BYTES], "big")
+        lo = BUCKET_OFFSET.unpack_from(self._mm, HEADER.size + bucket * BUCKET_OFFSET.size)[0]
+        hi = BUCKET_OFFSET.unpack_from(self._mm, HEADER.size + (bucket + 1) * BUCKET_OFFSET.size)[0]
+
+        while lo < hi:
+            mid = (lo + hi) // 2
+            offset = self._records_offset + mid * self._record_size
+            key = self._mm[offset: offset + self._key_size]
+            if key < ct_label:
+                lo = mid + 1
+            elif key > ct_label:
+                hi = mid
+            else:
+                value_offset, value_length = RECORD_POINTER.unpack_from(self._mm, offset + self._key_size)
+                return self._mm[value_offset: value_offset + value_length]
+
+        return None
+
+    def items(self) -> Iterator[Tuple[bytes, bytes]]:
+        for i in range(len(self)):
+            offset = self._records_offset + i * self._record_size
+            value_offset, value_length = RECORD_POINTER.unpack_from(self._mm, offset + self._key_size)
+            yield self._mm[offset: offset + self._key_size], self._mm[value_offset: value_offset + value_length]
+
+    def __len__(self) -> int:
+        return self._count if self._mm is not None else 0
+
+    def close(self) -> None:
+        if self._mm is not None:
+            self._mm.close()
+            self._file.close()
+            self._mm = None
+            self._file = None
+
+    def __getstate__(self):
+        return {"path": self.path}
+
+    def __setstate__(self, state):
+        self.__init__(state["path"])
+
+
+def _read_run(path: str, start: int, length: int, record_size: int) -> Iterator[bytes]:
+    """
+    Reads the records of a sorted run, a chunk of READ_RECORDS records at a time.
+
+    :param path: The path of the runs file.
+    :param start: The offset of the run in the file.
+    :param length: The number of records of the run.
+    :param record_size: The size of a record.
+    :return: An iterator of the records of the run, in order.
+    """
+    with open(path, "rb") as f:
+        f.seek(start)
+        remaining = length
+        while remaining > 0:
+            chunk = f.read(min(remaining, READ_RECORDS) * record_size)
+            for i in range(0, len(chunk), record_size):
+                yield chunk[i: i + record_size]
+            remaining -= len(chunk) // record_size
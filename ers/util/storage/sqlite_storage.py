@@ -0,0 +1,46 @@
+import sqlite3
+from typing import Iterable, Iterator, Optional, Tuple
+
+from ers.util.storage.storage import EncryptedIndexStorage
+
+
+class SQLiteStorage(EncryptedIndexStorage):
+    """
+    Keeps the encrypted index in an SQLite database file, in a table clustered by the ciphertext label.
+
+    If the database already contains an index, it is opened as a prebuilt index.
+    """
+
+    def __init__(self, path: str):
+        """
+        Initializes the storage backed by the given database file.
+
+        :param path: The path of the database file.
+        """
+        self.path = path
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute("CREATE TABLE IF NOT EXISTS entries (label BLOB PRIMARY KEY, value BLOB NOT NULL) WITHOUT ROWID")
+
+    def load(self, entries: Iterable[Tuple[bytes, bytes]]) -> None:
+        with self._connection:
+            self._connection.execute("DELETE FROM entries")
+            self._connection.executemany("INSERT INTO entries (label, value) VALUES (?, ?)", entries)
+
+    def get(self, ct_label: bytes) -> Optional[bytes]:
+        row = self._connection.execute("SELECT value FROM entries WHERE label = ?", (ct_label,)).fetchone()
+        return row[0] if row is not None else None
+
+    def items(self) -> Iterator[Tuple[bytes, bytes]]:
+        return iter(self._connection.execute("SELECT label, value FROM entries"))
+
+    def __len__(self) -> int:
+        return self._connection.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+    def close(self) -> None:
+        self._connection.close()
+
+    def __getstate__(self):
+        return {"path": self.path}
+
+    def __setstate__(self, state):
+        self.__init__(state["path"])
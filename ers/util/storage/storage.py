@@ -0,0 +1,63 @@
+from typing import Iterable, Iterator, Optional, Tuple
+
+
+class EncryptedIndexStorage:
+    """
+    Abstract base class for the storage of an encrypted index, i.e., a map from ciphertext labels to
+    ciphertext values.
+
+    The index is written once, through `load`, and is read-only afterward. Subclasses implement the
+    bulk load, the point lookup and the iteration; the dictionary-like accessors are derived from them.
+    """
+
+    def load(self, entries: Iterable[Tuple[bytes, bytes]]) -> None:
+        """
+        Stores the given entries, replacing any previous content.
+
+        :param entries: An iterable of (ciphertext label, ciphertext value) pairs.
+        """
+        pass
+
+    def get(self, ct_label: bytes) -> Optional[bytes]:
+        """
+        Looks up a ciphertext label.
+
+        :param ct_label: The ciphertext label.
+        :return: The ciphertext value stored under the label, or None if the label is absent.
+        """
+        pass
+
+    def items(self) -> Iterator[Tuple[bytes, bytes]]:
+        """
+        Iterates over all stored entries.
+
+        :return: An iterator of (ciphertext label, ciphertext value) pairs.
+        """
+        pass
+
+    def __len__(self) -> int:
+        pass
+
+    def close(self) -> None:
+        """
+        Releases the resources held by the storage, if any.
+        """
+        pass
+
+    def keys(self) -> Iterator[bytes]:
+        return (ct_label for ct_label, _ in self.items())
+
+    def values(self) -> Iterator[bytes]:
+        return (ct_value for _, ct_value in self.items())
+
+    def __iter__(self) -> Iterator[bytes]:
+        return self.keys()
+
+    def __contains__(self, ct_label: bytes) -> bool:
+        return self.get(ct_label) is not None
+
+    def __getitem__(self, ct_label: bytes) -> bytes:
+        ct_value = self.get(ct_label)
+        if ct_value is None:
+            raise KeyError(ct_label)
+        return ct_value